@@ -0,0 +1,54 @@
+"""Start-up time of the 'sp' CLI on paths that never run a report.
+
+Each case runs in a fresh interpreter and the median wall time is compared with
+a budget, so a heavy import creeping into 'sp.cli' fails the benchmark.
+
+Run with 'python benchmark/bench_cli_startup.py [--runs N] [--budget SECONDS]'.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+REPO_ROOT = Path(__file__).parents[1]
+CASES = {
+    "help": ["--help"],
+    "command help": ["div-doh", "xml-report", "--help"],
+    "missing option": ["div-doh", "xml-report"],
+    "invalid choice": ["div-doh", "xml-batch", "--manifest", "pyproject.toml", "--backend", "gpu"],
+}
+
+
+def run_python(code: str, args: List[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code, *args], cwd=REPO_ROOT, capture_output=True, check=False)
+
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=0.3, help="median seconds allowed per case")
+    args = parser.parse_args()
+
+    # References, what the interpreter alone and what importing the report stack cost.
+    for name, code in [("bare interpreter", "pass"), ("report stack", "import sp.xml_writer")]:
+        print(f"{name:<16}{statistics.median(run_python(code, []) for _ in range(args.runs)):>8.3f}s")
+
+    over_budget = False
+    for name, cli_args in CASES.items():
+        seconds = statistics.median(run_python("from sp.cli import cli; cli()", cli_args) for _ in range(args.runs))
+        over_budget |= seconds > args.budget
+        print(f"{name:<16}{seconds:>8.3f}s{'  OVER BUDGET' if seconds > args.budget else ''}")
+
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Micro-benchmark of FIFO pairing, the former pydantic 'Action' loop against 'sp.fifo.match_fifo'.
+
+Run with 'python benchmark/bench_lots.py [--fills N]'.
+"""
+
+import argparse
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import List, Tuple, TypeVar
+
+import numpy as np
+
+from sp.base import BaseModel
+from sp.fifo import match_fifo
+from sp.utils import PRECISION_GUARD
+
+A = TypeVar("A", bound="Action")
+
+
+class Action(BaseModel):
+    """A lot of the former queue based FifoPositionReport."""
+
+    type: str
+    date: str
+    num_shares: float
+    price: float
+
+    def __sub__(self: A, other: A) -> A:
+        returned_action = self.copy()
+        returned_action.num_shares -= other.num_shares
+
+        return returned_action
+
+
+class BuyAction(Action):
+    type: str = "Buy"
+
+
+class SellAction(Action):
+    type: str = "Sell"
+
+
+def pair_actions(buys: List[Action], sells: List[Action]) -> int:
+    """The pairing step of the former queue based FifoPositionReport."""
+    pairs = 0
+    buy_iter, sell_iter = iter(buys), iter(sells)
+    buy_action, sell_action = None, None
+
+    while True:
+        buy_action = next(buy_iter) if buy_action is None else buy_action
+        sell_action = next(sell_iter, None) if sell_action is None else sell_action
+        if sell_action is None:
+            return pairs
+
+        if sell_action.num_shares >= buy_action.num_shares:
+            paired_sell_action = sell_action.copy()
+            paired_sell_action.num_shares = buy_action.num_shares
+            sell_action = sell_action - paired_sell_action
+            if sell_action.num_shares < PRECISION_GUARD:
+                sell_action = None
+            buy_action = None
+        else:
+            paired_buy_action = buy_action.copy()
+            paired_buy_action.num_shares = sell_action.num_shares
+            buy_action = buy_action - paired_buy_action
+            if buy_action.num_shares < PRECISION_GUARD:
+                buy_action = None
+            sell_action = None
+
+        pairs += 1
+
+
+def pair_arrays(buys: List[Tuple[str, float, float]], sells: List[Tuple[str, float, float]]) -> int:
+    """The pairing of FifoPositionReport, including the conversion of the fills to arrays."""
+    buy_shares = np.array([num_shares for _, num_shares, _ in buys])
+    sell_shares = np.array([num_shares for _, num_shares, _ in sells])
+    shares, _, _ = match_fifo(buy_shares, sell_shares)
+
+    return len(shares)
+
+
+def fills(n_fills: int) -> Tuple[List[Tuple[str, float, float]], List[Tuple[str, float, float]]]:
+    buys = [("2022-01-01", 1.0 + (i % 7) / 10, 100.0 + i % 13) for i in range(n_fills)]
+    sells = [("2022-06-01", 0.8 + (i % 5) / 10, 110.0 + i % 11) for i in range(n_fills)]
+
+    return buys, sells
+
+
+def measure(name: str, run: Callable[[], int], n_fills: int) -> None:
+    start = time.perf_counter()
+    pairs = run()
+    elapsed = time.perf_counter() - start
+
+    # Allocations are traced in a separate run, tracing slows the loop down considerably.
+    tracemalloc.start()
+    _ = run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:>8}: {pairs} pairs, {1e6 * elapsed / n_fills:8.2f} us/fill, {peak / n_fills:8.1f} B/fill peak")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fills", type=int, default=20_000)
+    args = parser.parse_args()
+
+    buys, sells = fills(args.fills)
+
+    measure(
+        "pydantic",
+        lambda: pair_actions(
+            [BuyAction(date=d, num_shares=n, price=p) for d, n, p in buys],
+            [SellAction(date=d, num_shares=n, price=p) for d, n, p in sells],
+        ),
+        args.fills,
+    )
+    measure("numpy", lambda: pair_arrays(buys, sells), args.fills)
+
+
+if __name__ == "__main__":
+    main()
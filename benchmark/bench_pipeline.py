@@ -0,0 +1,159 @@
+"""Wall time and peak RSS of the report pipeline on synthetic Trading212 exports of several sizes.
+
+Every stage runs in a fresh interpreter, so its peak RSS isn't inflated by the
+stages before it. Results are compared with 'baselines.json' and the run fails
+when a stage got slower or bigger than the tolerance allows.
+
+Run with 'python benchmark/bench_pipeline.py [--sizes small medium] [--save]'.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Dict, List
+
+from sp._testing.synthetic import SyntheticExport
+from sp.profile import peak_rss_mb
+
+BASELINES_PATH = Path(__file__).parent / "baselines.json"
+SIZES = {
+    "small": SyntheticExport(n_tickers=10, fills_per_ticker=50, years=[2020, 2021, 2022], n_files=3),
+    "medium": SyntheticExport(n_tickers=50, fills_per_ticker=400, years=[2019, 2020, 2021, 2022], n_files=4),
+    "large": SyntheticExport(n_tickers=200, fills_per_ticker=1_000, years=list(range(2018, 2023)), n_files=10),
+}
+STAGES = ["read", "fifo", "dividends", "xml", "xml-pipeline"]
+
+
+def stage_runner(stage: str, data_path: Path, years: List[int], work_path: Path) -> Callable[[], object]:
+    from sp.history import DividendHistory, PositionHistory
+    from sp.report import DividendReport, FifoPositionReport
+    from sp.xml_writer import DivDohXML
+
+    if stage == "read":
+        return lambda: [
+            history.read() for history in [DividendHistory(path=data_path), PositionHistory(path=data_path)]
+        ]
+    if stage == "fifo":
+        return lambda: FifoPositionReport(years=years, history=PositionHistory(path=data_path)).create_report()
+    if stage == "dividends":
+        return lambda: DividendReport(years=years, history=DividendHistory(path=data_path)).create_report()
+
+    taxpayer = {
+        "base_info": {
+            "tax_number": "12345678",
+            "tax_payer_type": "FO",
+            "name": "Benchmark",
+            "address": "Benchmark 1",
+            "city": "Ljubljana",
+            "post_number": "1000",
+            "birth_date": "1990-01-01",
+        },
+        "doh_div_info": {
+            "period": str(years[-1]),
+            "email_address": "benchmark@example.com",
+            "phone_number": "000000000",
+            "resident_country": "SI",
+        },
+    }
+    (work_path / "taxpayer.json").write_text(json.dumps(taxpayer))
+    writer = DivDohXML(
+        personal_info_path=work_path / "taxpayer.json",
+        input_path=data_path,
+        output_path=work_path / "doh-div.xml",
+        pipeline=stage == "xml-pipeline",
+    )
+
+    return writer.write
+
+
+def run_stage(stage: str, data_path: Path, years: List[int], repeat: int) -> Dict[str, float]:
+    """Run a single stage in this interpreter, best of 'repeat' wall times."""
+    with tempfile.TemporaryDirectory() as work_path:
+        run = stage_runner(stage, data_path, years, Path(work_path))
+        timings = []
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+
+    return {"seconds": min(timings), "peak_rss_mb": peak_rss_mb()}
+
+
+def measure(sizes: List[str], stages: List[str], repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+
+    with tempfile.TemporaryDirectory() as root:
+        for size in sizes:
+            data_path = Path(root) / size
+            export = SIZES[size]
+            export.write(data_path)
+            years = [str(year) for year in export.years]
+
+            for stage in stages:
+                command = [sys.executable, __file__, "--run-stage", stage, "--data", str(data_path), "--years", *years]
+                output = subprocess.run(
+                    [*command, "--repeat", str(repeat)], check=True, capture_output=True, text=True
+                ).stdout
+                results[f"{size}/{stage}"] = json.loads(output)
+
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], time_tolerance: float, rss_tolerance: float) -> bool:
+    """Print the results next to the baselines and return whether any stage regressed."""
+    baselines = json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}
+    regressed = False
+
+    print(f"{'benchmark':<20}{'seconds':>10}{'baseline':>10}{'RSS MB':>10}{'baseline':>10}")
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        flag = ""
+
+        if baseline is not None and (
+            result["seconds"] > time_tolerance * baseline["seconds"]
+            or result["peak_rss_mb"] > rss_tolerance * baseline["peak_rss_mb"]
+        ):
+            flag = "  REGRESSION"
+            regressed = True
+
+        seconds, rss = (baseline["seconds"], baseline["peak_rss_mb"]) if baseline else (float("nan"), float("nan"))
+        print(f"{name:<20}{result['seconds']:>10.3f}{seconds:>10.3f}{result['peak_rss_mb']:>10.1f}{rss:>10.1f}{flag}")
+
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--time-tolerance", type=float, default=1.5)
+    parser.add_argument("--rss-tolerance", type=float, default=1.25)
+    parser.add_argument("--save", action="store_true", help="store the results as the new baselines")
+    parser.add_argument("--run-stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--data", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--years", type=int, nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage is not None:
+        print(json.dumps(run_stage(args.run_stage, args.data, args.years, args.repeat)))
+        return
+
+    results = measure(args.sizes, args.stages, args.repeat)
+    regressed = compare(results, args.time_tolerance, args.rss_tolerance)
+
+    if args.save:
+        baselines = json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}
+        BASELINES_PATH.write_text(json.dumps({**baselines, **results}, indent=4, sort_keys=True) + "\n")
+    elif regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,7 @@ setup(
     author_email="matic.pecovnik@gmail.com",
     packages=find_packages(),
     include_package_data=True,
+    package_data={"sp": ["data/*.csv"]},
     install_requires=parse_requirements("requirements.txt"),
     zip_safe=False,
     entry_points={"console_scripts": ["sp=sp.cli:cli"]},
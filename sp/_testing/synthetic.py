@@ -0,0 +1,139 @@
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from ..base import BaseModel
+from ..history import DividendHistory, PositionHistory
+
+# Column layout of a Trading212 export: the columns the histories read, followed by
+# the ones only the export carries.
+EXPORT_COLUMNS = list(
+    dict.fromkeys(
+        [
+            "Action",
+            *DividendHistory._columns,  # pylint: disable=protected-access
+            *PositionHistory._columns,  # pylint: disable=protected-access
+            "Currency (Withholding tax)",
+            "Charge amount (EUR)",
+            "Notes",
+            "ID",
+            "Currency conversion fee (EUR)",
+        ]
+    )
+)
+# Issuers DivDohXML knows the address of, every synthetic fund belongs to one of them.
+ISSUERS = ["Vanguard", "iShares"]
+
+
+class SyntheticExport(BaseModel):
+    """Deterministic Trading212 like exports of a portfolio of 'n_tickers' funds.
+
+    Every ticker gets 'fills_per_ticker' market orders spread over 'years' and
+    'dividends_per_year' dividends per year. Sells never exceed the shares held,
+    so the history is always valid for FIFO matching. The same arguments always
+    produce the same files.
+    """
+
+    n_tickers: int = 10
+    fills_per_ticker: int = 100
+    years: List[int] = [2020, 2021, 2022]
+    n_files: int = 3
+    dividends_per_year: int = 4
+    seed: int = 0
+
+    @property
+    def year_starts(self) -> np.ndarray:
+        """Seconds from the start of the first year to the start of every year and the end of the last one."""
+        starts = pd.to_datetime([f"{year}-01-01" for year in [*self.years, self.years[-1] + 1]])
+
+        return ((starts - starts[0]).total_seconds()).to_numpy().astype(np.int64)
+
+    def ticker_fills(self, rng: np.random.Generator, ticker: int) -> pd.DataFrame:
+        times = np.sort(rng.integers(0, self.year_starts[-1], self.fills_per_ticker))
+        prices = np.round(rng.uniform(10.0, 500.0) * rng.lognormal(0.0, 0.05, self.fills_per_ticker), 2)
+        shares = np.round(rng.uniform(0.1, 10.0, self.fills_per_ticker), 7)
+        is_sell = rng.random(self.fills_per_ticker) < 0.2
+
+        held = 0.0
+        for fill in range(self.fills_per_ticker):
+            if is_sell[fill]:
+                # Sell a part of the position, a sell on an empty position becomes a buy.
+                shares[fill] = np.floor(held * shares[fill] / 10.0 * 1e7) / 1e7
+                is_sell[fill] = shares[fill] > 0.0
+                shares[fill] = shares[fill] if is_sell[fill] else 1.0
+            held += -shares[fill] if is_sell[fill] else shares[fill]
+
+        return pd.DataFrame(
+            {
+                "Action": np.where(is_sell, "Market sell", "Market buy"),
+                "Time": times,
+                "No. of shares": shares,
+                "Price / share": prices,
+                "ID": [f"EOF{ticker:05d}{fill:07d}" for fill in range(self.fills_per_ticker)],
+            }
+        )
+
+    def ticker_dividends(self, rng: np.random.Generator) -> pd.DataFrame:
+        n_dividends = self.dividends_per_year * len(self.years)
+        starts = np.repeat(self.year_starts[:-1], self.dividends_per_year)
+        stops = np.repeat(self.year_starts[1:], self.dividends_per_year)
+
+        return pd.DataFrame(
+            {
+                "Action": "Dividend (Ordinary)",
+                "Time": rng.integers(starts, stops, n_dividends),
+                "No. of shares": np.round(rng.uniform(1.0, 50.0, n_dividends), 7),
+                "Price / share": np.round(rng.uniform(0.05, 1.0, n_dividends), 6),
+            }
+        )
+
+    def history(self) -> pd.DataFrame:
+        """All rows of the exports ordered by time."""
+        rng = np.random.default_rng(self.seed)
+        tickers = []
+
+        for ticker in range(self.n_tickers):
+            currency, exchange_rate = ("EUR", 1.0) if ticker % 2 == 0 else ("USD", round(rng.uniform(1.0, 1.2), 5))
+            ticker_history = pd.concat([self.ticker_fills(rng, ticker), self.ticker_dividends(rng)], ignore_index=True)
+
+            tickers.append(
+                ticker_history.assign(
+                    ISIN=f"IE{ticker:010d}",
+                    Ticker=f"T{ticker:04d}",
+                    Name=f"{ISSUERS[ticker % len(ISSUERS)]} Synthetic Fund {ticker}",
+                    **{"Currency (Price / share)": currency, "Exchange rate": exchange_rate},
+                )
+            )
+
+        history = pd.concat(tickers, ignore_index=True)
+        history = history.sort_values("Time", kind="stable", ignore_index=True)
+
+        total = history["No. of shares"] * history["Price / share"] / history["Exchange rate"]
+        is_dividend = history.Action == "Dividend (Ordinary)"
+        is_taxed = is_dividend & (history["Currency (Price / share)"] == "USD")
+        start = pd.Timestamp(f"{self.years[0]}-01-01")
+
+        return history.assign(
+            Time=(start + pd.to_timedelta(history.Time, unit="s")).dt.strftime("%Y-%m-%d %H:%M:%S"),
+            **{
+                "Total (EUR)": total.round(2),
+                "Withholding tax": (0.15 * total).where(is_taxed).round(2),
+                "Currency (Withholding tax)": np.where(is_dividend, history["Currency (Price / share)"], None),
+            },
+        ).reindex(columns=EXPORT_COLUMNS)
+
+    def write(self, path: Path) -> List[Path]:
+        """Write the history to 'n_files' consecutive exports in 'path' and return their paths."""
+        path.mkdir(parents=True, exist_ok=True)
+        history = self.history()
+        bounds = np.linspace(0, len(history), self.n_files + 1).astype(int)
+        csv_paths = []
+
+        for number, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            csv_path = path / f"export_{number:03d}.csv"
+            history.iloc[start:stop].to_csv(csv_path, index=False, float_format="%.10g")
+            csv_paths.append(csv_path)
+
+        return csv_paths
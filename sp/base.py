@@ -0,0 +1,48 @@
+from typing import List
+
+import pandas as pd
+from pydantic import BaseModel as PydanticBaseModel
+from pydantic import Extra
+
+
+class BaseModel(PydanticBaseModel):
+
+    # Change default config
+    class Config:
+        validate_assignment = True
+        extra = Extra.allow
+
+
+def concat_histories(histories: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate histories, keeping categorical columns categorical even if their categories differ."""
+    if not histories:
+        return pd.DataFrame()
+
+    categorical_columns = [
+        column
+        for column, dtype in histories[0].dtypes.items()
+        if isinstance(dtype, pd.CategoricalDtype)
+        and all(isinstance(history[column].dtype, pd.CategoricalDtype) for history in histories)
+    ]
+
+    for column in categorical_columns:
+        categories = histories[0][column].cat.categories
+        for history in histories[1:]:
+            categories = categories.union(history[column].cat.categories, sort=False)
+
+        histories = [
+            history.assign(**{column: history[column].cat.set_categories(categories)}) for history in histories
+        ]
+
+    return pd.concat(histories, ignore_index=True)
+
+
+def uncategorize(frame: pd.DataFrame) -> pd.DataFrame:
+    """Replace categorical columns by their values, for outputs that keep the dtypes of the exports."""
+    return frame.astype(
+        {
+            column: dtype.categories.dtype
+            for column, dtype in frame.dtypes.items()
+            if isinstance(dtype, pd.CategoricalDtype)
+        }
+    )
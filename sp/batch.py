@@ -0,0 +1,90 @@
+import json
+import time
+import traceback
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import List, Optional
+
+from .executor import ReportExecutor
+from .model import BaseModel
+from .xml_writer import DivDohXML
+
+
+def format_error(error: BaseException) -> str:
+    return "".join(traceback.format_exception_only(type(error), error)).strip()
+
+
+class BatchJob(BaseModel):
+    taxpayer_info: Path
+    data_path: Path
+    xml_path: Path
+
+    def resolve(self, base_path: Path) -> "BatchJob":
+        return BatchJob(
+            taxpayer_info=base_path / self.taxpayer_info,
+            data_path=base_path / self.data_path,
+            xml_path=base_path / self.xml_path,
+        )
+
+
+class BatchResult(BaseModel):
+    job: BatchJob
+    seconds: float
+    error: Optional[str] = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+
+class DivDohBatch(BaseModel):
+    """Doh-Div reports of many taxpayers, computed on one shared report executor."""
+
+    jobs: List[BatchJob]
+    n_workers: Optional[int] = None
+    backend: str = "auto"
+    cache_path: Optional[Path] = None
+
+    @classmethod
+    def from_file(
+        cls, path: Path, n_workers: Optional[int] = None, backend: str = "auto", cache_path: Optional[Path] = None
+    ) -> "DivDohBatch":
+        """Read a JSON manifest '{"jobs": [{"taxpayer_info": ..., "data_path": ..., "xml_path": ...}]}'.
+
+        Relative paths are resolved against the directory of the manifest.
+        """
+        manifest = json.loads(path.read_text())
+        jobs = [BatchJob.parse_obj(job).resolve(path.parent) for job in manifest["jobs"]]
+
+        return cls(jobs=jobs, n_workers=n_workers, backend=backend, cache_path=cache_path)
+
+    def write_job(self, job: BatchJob, executor: ReportExecutor) -> None:
+        writer = DivDohXML(
+            personal_info_path=job.taxpayer_info,
+            input_path=job.data_path,
+            output_path=job.xml_path,
+            cache_path=self.cache_path,
+        )
+        writer.write(executor=executor)
+
+    def run(self) -> List[BatchResult]:
+        """Run every job, a failing job is recorded in its result and doesn't stop the batch."""
+        results = []
+
+        with ReportExecutor(backend=self.backend, n_workers=self.n_workers) as executor:
+            for job in self.jobs:
+                start = time.perf_counter()
+                error = None
+
+                try:
+                    self.write_job(job=job, executor=executor)
+                except BrokenProcessPool as broken_pool:
+                    # A crashed worker breaks the pool for every following job, start a new one.
+                    error = format_error(broken_pool)
+                    executor.shutdown()
+                except Exception as failure:  # pylint: disable=broad-except
+                    error = format_error(failure)
+
+                results.append(BatchResult(job=job, seconds=time.perf_counter() - start, error=error))
+
+        return results
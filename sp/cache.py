@@ -0,0 +1,246 @@
+import hashlib
+import json
+from collections.abc import Callable
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List
+
+import pandas as pd
+from pydantic import PrivateAttr
+
+from .base import BaseModel, concat_histories
+
+HASH_CHUNK_SIZE = 1 << 20
+# Bump whenever the layout of parsed histories changes, so stale entries are never served.
+CACHE_VERSION = "3"
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+
+    with path.open("rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class FileFingerprint(BaseModel):
+    path: str
+    size: int
+    mtime_ns: int
+    digest: str
+
+    @classmethod
+    def from_path(cls, path: Path) -> "FileFingerprint":
+        stat = path.stat()
+
+        return cls(path=str(path.resolve()), size=stat.st_size, mtime_ns=stat.st_mtime_ns, digest=file_digest(path))
+
+    def matches_stat(self, path: Path) -> bool:
+        """Cheap check that skips hashing when neither size nor mtime changed."""
+        stat = path.stat()
+
+        return self.path == str(path.resolve()) and self.size == stat.st_size and self.mtime_ns == stat.st_mtime_ns
+
+
+class HistoryCache(BaseModel):
+    """Parquet cache of parsed history files, keyed by the fingerprint of every source CSV."""
+
+    path: Path
+    hits: int = 0
+    misses: int = 0
+    entries: Dict[str, FileFingerprint] = {}
+    _lock: Lock = PrivateAttr(default_factory=Lock)
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def at(cls, path: Path) -> "HistoryCache":
+        """Return the cache stored at 'path', shared by every history reading from it in this process."""
+        cache = cls(path=path)
+        cache.path.mkdir(parents=True, exist_ok=True)
+
+        if cache.manifest_path.exists():
+            cache.entries = json.loads(cache.manifest_path.read_text())
+
+        return cache
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.path / "manifest.json"
+
+    @staticmethod
+    def entry_key(csv_path: Path, variant: Iterable[str]) -> str:
+        return hashlib.sha256("|".join([CACHE_VERSION, str(csv_path.resolve()), *variant]).encode()).hexdigest()
+
+    def load(self, csv_path: Path, variant: Iterable[str], parse: Callable[[Path], pd.DataFrame]) -> pd.DataFrame:
+        """Load the parsed 'csv_path' from the cache or parse it and store the result.
+
+        The 'variant' strings identify how the file was parsed (columns, filters, ...),
+        so differently configured histories never share an entry.
+        """
+        key = self.entry_key(csv_path, variant)
+        entry_path = self.path / f"{key}.parquet"
+        entry = self.entries.get(key)
+
+        if entry is not None and entry_path.exists():
+            if entry.matches_stat(csv_path):
+                self.record(key, entry, hit=True)
+                return pd.read_parquet(entry_path)
+
+            fingerprint = FileFingerprint.from_path(csv_path)
+            if fingerprint.digest == entry.digest:
+                self.record(key, fingerprint, hit=True)
+                return pd.read_parquet(entry_path)
+        else:
+            fingerprint = FileFingerprint.from_path(csv_path)
+
+        history = parse(csv_path)
+        history.to_parquet(entry_path, index=False)
+        self.record(key, fingerprint, hit=False)
+
+        return history
+
+    def record(self, key: str, fingerprint: FileFingerprint, hit: bool) -> None:
+        # Files may be loaded from several threads at once.
+        with self._lock:
+            self.entries[key] = fingerprint
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def save(self) -> None:
+        self.manifest_path.write_text(
+            json.dumps({key: fingerprint.dict() for key, fingerprint in self.entries.items()}, indent=4)
+        )
+
+    def clear(self) -> None:
+        for entry_path in self.path.glob("*.parquet"):
+            entry_path.unlink()
+
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.save()
+
+
+class HistoryStore(BaseModel):
+    """History that is extended incrementally with new or changed CSV files.
+
+    Every ingested file is kept as its own Parquet part with all of its rows, and
+    the manifest remembers the fingerprint of every ingested file. Only files that
+    appeared or changed since the last ingestion are parsed and written, and rows
+    repeated across overlapping exports are dropped only from the returned history,
+    so changing or removing one of the exports never loses rows of the others.
+
+    Parts and manifest are kept per 'name' and data 'directory', so histories of
+    different directories can share the store 'path'. The manifest also records the
+    cache version and the 'variant' of the parsing, and all parts are parsed again
+    when either changed.
+    """
+
+    path: Path
+    name: str
+    directory: Path
+    variant: List[str] = []
+    entries: Dict[str, FileFingerprint] = {}
+
+    @property
+    def prefix(self) -> str:
+        return f"{self.name}-{hashlib.sha256(str(self.directory.resolve()).encode()).hexdigest()[:16]}"
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.path / f"{self.prefix}.json"
+
+    def part_path(self, source: str) -> Path:
+        return self.path / f"{self.prefix}-{hashlib.sha256(source.encode()).hexdigest()[:16]}.parquet"
+
+    def load_manifest(self) -> None:
+        manifest = json.loads(self.manifest_path.read_text()) if self.manifest_path.exists() else {}
+
+        if manifest.get("version") == CACHE_VERSION and manifest.get("variant") == self.variant:
+            self.entries = manifest["entries"]
+            return
+
+        # Parts written by another version or variant would be served as current, so drop them all.
+        for part_path in self.path.glob(f"{self.prefix}-*.parquet"):
+            part_path.unlink()
+        self.entries = {}
+
+    def is_current(self, csv_path: Path) -> bool:
+        source = str(csv_path.resolve())
+        entry = self.entries.get(source)
+
+        if entry is None or not self.part_path(source).exists():
+            return False
+        if entry.matches_stat(csv_path):
+            return True
+
+        fingerprint = FileFingerprint.from_path(csv_path)
+        if fingerprint.digest != entry.digest:
+            return False
+
+        # Same content under a new mtime, remember it to skip hashing next time.
+        self.entries[source] = fingerprint
+        return True
+
+    def ingest(self, csv_paths: Iterable[Path], parse: Callable[[Path], pd.DataFrame]) -> pd.DataFrame:
+        """Store the new or changed 'csv_paths', forget removed files and return the merged history.
+
+        Rows repeated across overlapping exports are dropped by their 'ID'.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.load_manifest()
+
+        sources = {str(csv_path.resolve()): csv_path for csv_path in csv_paths}
+
+        for source in set(self.entries) - set(sources):
+            self.part_path(source).unlink(missing_ok=True)
+            del self.entries[source]
+
+        for source, csv_path in sources.items():
+            if not self.is_current(csv_path):
+                parse(csv_path).assign(SOURCE=source).to_parquet(self.part_path(source), index=False)
+                self.entries[source] = FileFingerprint.from_path(csv_path)
+
+        self.save_manifest()
+
+        # Parts are merged in a fixed order, so the same copy of a repeated row is kept on every run.
+        history = concat_histories([pd.read_parquet(self.part_path(source)) for source in sorted(sources)])
+        if history.empty:
+            return history
+
+        history = history.sort_values("Time", kind="stable")
+
+        return history[~self.duplicated(history)].reset_index(drop=True)
+
+    @staticmethod
+    def duplicated(history: pd.DataFrame) -> pd.Series:
+        """Mark rows already contained in an overlapping export.
+
+        Rows are matched by 'ID'. Rows without one (e.g. dividends) are matched by
+        their content, but only against rows of other files, so legitimate repeats
+        within a single export are kept.
+        """
+        has_id = history.ID.notna().to_numpy()
+        duplicated = has_id & history.ID.duplicated().to_numpy()
+
+        if not has_id.all():
+            # Only rows without an 'ID' need the comparison of their whole content.
+            without_id = history[~has_id]
+            content = [column for column in history.columns if column not in ("ID", "SOURCE")]
+            first_source = without_id.groupby(content, dropna=False, sort=False, observed=True)["SOURCE"].transform(
+                "first"
+            )
+            duplicated[~has_id] = (without_id.SOURCE != first_source).to_numpy()
+
+        return pd.Series(duplicated, index=history.index)
+
+    def save_manifest(self) -> None:
+        entries = {key: fingerprint.dict() for key, fingerprint in self.entries.items()}
+        self.manifest_path.write_text(
+            json.dumps({"version": CACHE_VERSION, "variant": self.variant, "entries": entries}, indent=4)
+        )
@@ -1,9 +1,18 @@
-"""Module that implements command line interface for the package."""
+"""Module that implements command line interface for the package.
+
+Only click is imported at module level. Options are validated by click, and the
+report stack (pandas, pydantic, ...) is imported inside the commands, so '--help'
+and invalid arguments return without loading it.
+"""
 
 from pathlib import Path
+from typing import Optional
 
 import click
 
+# Mirrors 'sp.executor.BACKENDS', which can't be imported here without pulling in pydantic.
+BACKENDS = ["auto", "process", "thread", "serial"]
+
 
 @click.group()
 def cli() -> None:
@@ -16,15 +25,113 @@ def div_doh() -> None:
 
 
 @div_doh.command(name="xml-report")
-@click.option("--taxpayer-info", default=None, help="Config JSON that holds the tax-payer info.")
-@click.option("--data-path", default=None, help="Directory that holds the input data.")
-@click.option("--xml-path", default=None, help="Path to XML output report.")
-def create_div_doh_xml_report(taxpayer_info: str, data_path: str, xml_path: str) -> None:
+@click.option(
+    "--taxpayer-info",
+    required=True,
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Config JSON that holds the tax-payer info.",
+)
+@click.option(
+    "--data-path",
+    required=True,
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    help="Directory that holds the input data.",
+)
+@click.option(
+    "--xml-path", required=True, type=click.Path(dir_okay=False, path_type=Path), help="Path to XML output report."
+)
+@click.option(
+    "--cache-path",
+    default=None,
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Directory that caches the parsed input data between runs.",
+)
+@click.option(
+    "--payers-path",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="CSV registry of dividend payers, the bundled one by default.",
+)
+@click.option(
+    "--pipeline",
+    is_flag=True,
+    help="Overlap computing and writing the report instead of running them one after another.",
+)
+@click.option(
+    "--profile",
+    default=None,
+    is_flag=False,
+    flag_value="text",
+    type=click.Choice(["text", "json"]),
+    help="Print the time, rows and memory of every stage, as a table or as JSON.",
+)
+def create_div_doh_xml_report(  # pylint: disable=too-many-positional-arguments
+    taxpayer_info: Path,
+    data_path: Path,
+    xml_path: Path,
+    cache_path: Optional[Path],
+    payers_path: Optional[Path],
+    pipeline: bool,
+    profile: Optional[str],
+) -> None:
+    from sp.profile import profiling
     from sp.xml_writer import DivDohXML
 
     writer = DivDohXML(
-        personal_info_path=Path(taxpayer_info),
-        input_path=Path(data_path),
-        output_path=Path(xml_path),
+        personal_info_path=taxpayer_info,
+        input_path=data_path,
+        output_path=xml_path,
+        cache_path=cache_path,
+        payers_path=payers_path,
+        pipeline=pipeline,
     )
-    writer.write()
+
+    if profile is None:
+        writer.write()
+        return
+
+    with profiling() as run_profile:
+        writer.write()
+
+    click.echo(run_profile.to_json() if profile == "json" else run_profile.summary())
+
+
+@div_doh.command(name="xml-batch")
+@click.option(
+    "--manifest",
+    required=True,
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="JSON manifest with the taxpayer-info, data-path and xml-path of every job.",
+)
+@click.option("--n-workers", default=None, type=int, help="Number of workers shared by all jobs.")
+@click.option(
+    "--backend",
+    default="auto",
+    type=click.Choice(BACKENDS),
+    help="How per-ticker work is run, 'auto' skips worker processes for small portfolios.",
+)
+@click.option(
+    "--cache-path",
+    default=None,
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Directory that caches the parsed input data between runs.",
+)
+def create_div_doh_xml_batch(
+    manifest: Path, n_workers: Optional[int], backend: str, cache_path: Optional[Path]
+) -> None:
+    from sp.batch import DivDohBatch
+
+    batch = DivDohBatch.from_file(manifest, n_workers=n_workers, backend=backend, cache_path=cache_path)
+    results = batch.run()
+
+    for result in results:
+        status = "FAILED" if result.failed else "OK"
+        click.echo(f"{status:<6} {result.seconds:8.2f}s {result.job.xml_path}")
+        if result.error is not None:
+            click.echo(f"       {result.error}")
+
+    failed = sum(result.failed for result in results)
+    click.echo(f"{len(results) - failed} of {len(results)} reports written.")
+
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,199 @@
+import asyncio
+import math
+import os
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import starmap
+from typing import Any, AsyncGenerator, Deque, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import PrivateAttr, validator
+
+from .model import BaseModel, limit_to_cpu_count
+from .profile import ProfiledTask, active_profile, collect_profiles
+
+BACKENDS = ("auto", "process", "thread", "serial")
+
+# Below this many history rows starting worker processes costs more than the report itself.
+AUTO_MIN_ROWS = 20_000
+# Chunks per worker, so slow tickers can still be balanced between workers.
+CHUNKS_PER_WORKER = 4
+# Tasks per chunk at most, so the results held for a slow consumer don't grow with the portfolio.
+MAX_CHUNKSIZE = 64
+# Chunks per worker that 'map' runs ahead of the consumer.
+PENDING_CHUNKS_PER_WORKER = 2
+
+
+def run_chunk(func: Callable[..., Any], chunk: List[Tuple[Any, ...]]) -> List[Any]:
+    return [func(*args) for args in chunk]
+
+
+class ReportExecutor(BaseModel):
+    """Runs per-ticker report functions on a process pool, a thread pool or serially.
+
+    The pool is created on first use and reused by every following 'map' until
+    'shutdown', so one executor can serve many reports.
+    """
+
+    backend: str = "auto"
+    n_workers: Optional[int] = None
+    chunksize: Optional[int] = None
+    auto_min_rows: int = AUTO_MIN_ROWS
+    _pools: dict = PrivateAttr(default_factory=dict)
+
+    @validator("backend")
+    @classmethod
+    def check_backend(cls, value: str) -> str:
+        if value not in BACKENDS:
+            raise ValueError(f"Unsupported backend {value}, choose one of {BACKENDS}.")
+
+        return value
+
+    @validator("n_workers")
+    @classmethod
+    def limit_amount_of_workers(cls, value: Optional[int]) -> Optional[int]:
+        return None if value is None else limit_to_cpu_count(value)
+
+    def __enter__(self) -> "ReportExecutor":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.shutdown()
+
+    @property
+    def effective_workers(self) -> int:
+        return self.n_workers or os.cpu_count() or 1
+
+    def resolve_backend(self, n_tasks: int, n_rows: Optional[int] = None) -> str:
+        if self.backend != "auto":
+            return self.backend
+
+        if n_tasks <= 1 or self.effective_workers == 1 or (n_rows is not None and n_rows < self.auto_min_rows):
+            return "serial"
+
+        return "process"
+
+    def pool(self, backend: str) -> Executor:
+        if backend not in self._pools:
+            if backend == "process":
+                self._pools[backend] = ProcessPoolExecutor(max_workers=self.n_workers)
+            else:
+                self._pools[backend] = ThreadPoolExecutor(max_workers=self.n_workers)
+
+        return self._pools[backend]
+
+    def task_chunksize(self, n_tasks: int) -> int:
+        if self.chunksize is not None:
+            return self.chunksize
+
+        return min(MAX_CHUNKSIZE, max(1, math.ceil(n_tasks / (CHUNKS_PER_WORKER * self.effective_workers))))
+
+    def map(self, func: Callable[..., Any], *iterables: Iterable[Any], n_rows: Optional[int] = None) -> Iterator[Any]:
+        """Map 'func' over 'iterables' and yield the results in order.
+
+        Process workers receive the tasks in chunks, so 'func' (and the report it is
+        bound to) is pickled once per chunk instead of once per ticker. 'n_rows' is the
+        size of the data behind the tasks and lets the 'auto' backend skip pools for
+        small portfolios. While a profile is active, the stages run in pool workers
+        are returned with the results and merged into it.
+        """
+        tasks = list(zip(*[list(iterable) for iterable in iterables]))
+        backend = self.resolve_backend(n_tasks=len(tasks), n_rows=n_rows)
+
+        if backend == "serial":
+            return starmap(func, tasks)
+
+        return self.iter_chunks(backend, func, tasks)
+
+    def iter_chunks(self, backend: str, func: Callable[..., Any], tasks: List[Tuple[Any, ...]]) -> Iterator[Any]:
+        """Run 'tasks' in chunks on the pool of 'backend' and yield their results in order.
+
+        Only a couple of chunks per worker are running or waiting for the consumer, so
+        a slow consumer pauses the pool instead of piling up results. Chunks that
+        haven't started are cancelled when the consumer stops early.
+        """
+        pool = self.pool(backend)
+        chunksize = self.task_chunksize(len(tasks)) if backend == "process" else 1
+        profile = active_profile()
+        task_func = func if profile is None else ProfiledTask(func)
+        pending: Deque[Future] = deque()
+
+        def results(chunk_future: Future) -> List[Any]:
+            chunk_results = chunk_future.result()
+            return chunk_results if profile is None else list(collect_profiles(profile, chunk_results))
+
+        try:
+            for start in range(0, len(tasks), chunksize):
+                if len(pending) >= PENDING_CHUNKS_PER_WORKER * self.effective_workers:
+                    yield from results(pending.popleft())
+                pending.append(pool.submit(run_chunk, task_func, tasks[start : start + chunksize]))
+
+            while pending:
+                yield from results(pending.popleft())
+        finally:
+            for chunk_future in pending:
+                chunk_future.cancel()
+
+    async def amap(
+        self, func: Callable[..., Any], *iterables: Iterable[Any], n_rows: Optional[int] = None, queue_size: int = 1
+    ) -> AsyncGenerator[Any, None]:
+        """Asynchronous 'map' with backpressure, results are yielded in order.
+
+        At most 'queue_size' chunks of tasks are running or waiting for the consumer,
+        so a slow consumer pauses the workers instead of piling up results. Serial
+        tasks run one at a time in a thread, which still overlaps them with the consumer.
+        """
+        tasks = list(zip(*[list(iterable) for iterable in iterables]))
+        backend = self.resolve_backend(n_tasks=len(tasks), n_rows=n_rows)
+        chunksize = self.task_chunksize(len(tasks)) if backend == "process" else 1
+
+        profile = active_profile()
+        task_func = ProfiledTask(func) if profile is not None and backend != "serial" else func
+
+        def submit(chunk: List[Tuple[Any, ...]]) -> "asyncio.Future[List[Any]]":
+            if backend == "serial":
+                # 'to_thread' copies the context, so serial stages record into the active profile.
+                return asyncio.ensure_future(asyncio.to_thread(run_chunk, task_func, chunk))
+
+            future: Future = self.pool(backend).submit(run_chunk, task_func, chunk)
+            return asyncio.wrap_future(future)
+
+        queue: "asyncio.Queue[Optional[asyncio.Future[List[Any]]]]" = asyncio.Queue()
+        slots = asyncio.Semaphore(max(1, queue_size))
+
+        async def produce() -> None:
+            try:
+                for start in range(0, len(tasks), chunksize):
+                    await slots.acquire()
+                    chunk_future = submit(tasks[start : start + chunksize])
+                    if backend == "serial":
+                        await asyncio.wait([chunk_future])
+                    await queue.put(chunk_future)
+            finally:
+                # Ends the consumer, which raises any error of the producer when awaiting it.
+                queue.put_nowait(None)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                chunk_future = await queue.get()
+                if chunk_future is None:
+                    break
+
+                results = await chunk_future
+                slots.release()
+                if profile is not None and task_func is not func:
+                    results = list(collect_profiles(profile, results))
+
+                for result in results:
+                    yield result
+
+            await producer
+        finally:
+            producer.cancel()
+
+    def shutdown(self) -> None:
+        for pool in self._pools.values():
+            pool.shutdown()
+
+        self._pools = {}
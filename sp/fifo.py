@@ -0,0 +1,70 @@
+from typing import Tuple
+
+import numpy as np
+
+from .utils import PRECISION_GUARD
+
+# Exports state shares with 10 decimals, lots are matched on whole units of that precision.
+SHARE_DECIMALS = 10
+SHARE_SCALE = 10**SHARE_DECIMALS
+GUARD_UNITS = round(PRECISION_GUARD * SHARE_SCALE)
+
+
+def share_units(shares: np.ndarray) -> np.ndarray:
+    """Shares as integer units, so cumulative sums stay exact at any amount of shares."""
+    return np.rint(np.asarray(shares, dtype=np.float64) * SHARE_SCALE).astype(np.int64)
+
+
+def match_fifo(buy_shares: np.ndarray, sell_shares: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pair sold shares with bought shares in a FIFO fashion.
+
+    Every lot covers an interval on the cumulative share axis of its side. The
+    pairs are the intersections of buy and sell intervals, so they are found by
+    merging both sets of interval bounds instead of walking the lots one by one.
+    Bounds are summed in integer 'share_units', so no rounding noise accumulates.
+
+    Returns the number of shares, the buy lot index and the sell lot index of
+    every pair, ordered by sell and then by buy.
+    """
+    buy_bounds = np.cumsum(share_units(buy_shares))
+    sell_bounds = np.cumsum(share_units(sell_shares))
+
+    if sell_bounds.size == 0:
+        return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    sold = sell_bounds[-1]
+    bought = buy_bounds[-1] if buy_bounds.size else 0
+    if sold - bought > GUARD_UNITS:
+        raise ValueError(f"Sold {sold / SHARE_SCALE} shares, but only {bought / SHARE_SCALE} were bought.")
+
+    bounds = np.union1d(buy_bounds[buy_bounds < sold], sell_bounds)
+    # Remnants smaller than the guard count as sold, they are merged into the next pair.
+    bounds = bounds[np.diff(bounds, append=np.iinfo(np.int64).max) >= GUARD_UNITS]
+    starts = np.concatenate(([0], bounds[:-1]))
+
+    # A pair belongs to the lots whose intervals contain the shares right after its start.
+    buy_index = np.minimum(np.searchsorted(buy_bounds, starts, side="right"), buy_bounds.size - 1)
+    sell_index = np.minimum(np.searchsorted(sell_bounds, starts, side="right"), sell_bounds.size - 1)
+
+    return (bounds - starts) / SHARE_SCALE, buy_index, sell_index
+
+
+def open_lots(buy_shares: np.ndarray, sell_shares: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Shares left in the buy lots once all sells were matched in a FIFO fashion.
+
+    Returns the remaining number of shares and the buy lot index of every lot that
+    is still open, the first one may be partially sold.
+    """
+    buy_units = share_units(buy_shares)
+    buy_bounds = np.cumsum(buy_units)
+    sold = int(share_units(sell_shares).sum())
+    bought = buy_bounds[-1] if buy_bounds.size else 0
+
+    if sold - bought > GUARD_UNITS:
+        raise ValueError(f"Sold {sold / SHARE_SCALE} shares, but only {bought / SHARE_SCALE} were bought.")
+
+    remaining = np.minimum(buy_units, buy_bounds - sold)
+    # Lots closer to the sold amount than the guard count as sold, like in 'match_fifo'.
+    lot_index = np.flatnonzero(remaining >= GUARD_UNITS)
+
+    return remaining[lot_index] / SHARE_SCALE, lot_index
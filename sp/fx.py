@@ -0,0 +1,154 @@
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .base import BaseModel
+from .cache import FileFingerprint
+
+BASE_CURRENCY = "EUR"
+# Prices of e.g. LSE listings are quoted in pence, their rates are those of the main unit scaled.
+SUBUNITS = {"GBX": ("GBP", 100.0), "GBp": ("GBP", 100.0)}
+# Markers of missing rates in the ECB reference rate files.
+RATE_NA_VALUES = ["N/A"]
+
+FileStats = Tuple[Tuple[str, int, int], ...]
+
+
+def rate_files(path: Path) -> List[Path]:
+    return [path] if path.is_file() else sorted(path.glob("*.csv"))
+
+
+def read_rate_file(csv_path: Path) -> pd.DataFrame:
+    """Rates of a file in the layout of the ECB reference rates, a 'Date' column and a column per currency."""
+    rates = pd.read_csv(csv_path, na_values=RATE_NA_VALUES, index_col="Date", parse_dates=["Date"])
+
+    # ECB files end every line with a separator, which adds an empty unnamed column.
+    return rates.loc[:, ~rates.columns.str.startswith("Unnamed")].astype("float64")
+
+
+class RateTable(BaseModel):
+    """Units of every currency per EUR by day, as published in local rate files.
+
+    Rates are forward filled over the days a currency wasn't published on, so a
+    lookup is a binary search for the last publication on or before a day. With a
+    'cache_path' the table is compiled to '.npy' files once and memory-mapped by
+    later runs, only the rows a lookup touches are paged in.
+    """
+
+    dates: np.ndarray
+    currencies: List[str]
+    rates: np.ndarray
+    files: List[FileFingerprint] = []
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def at(cls, path: Path, cache_path: Optional[Path] = None) -> "RateTable":
+        """The table of the rate files at 'path', shared by every history and report until a file changes."""
+        stats = tuple(
+            (str(csv_path.resolve()), csv_path.stat().st_size, csv_path.stat().st_mtime_ns)
+            for csv_path in rate_files(path)
+        )
+        if not stats:
+            raise ValueError(f"There are no exchange rate files at path: {path}.")
+
+        return load_rate_table(stats, cache_path)
+
+    @classmethod
+    def from_files(cls, csv_paths: List[Path]) -> "RateTable":
+        rates = pd.concat([read_rate_file(csv_path) for csv_path in csv_paths])
+        # Later files take precedence for days published in several of them.
+        rates = rates.groupby(level=0).last().sort_index().ffill()
+
+        return cls(
+            dates=rates.index.to_numpy().astype("datetime64[D]"),
+            currencies=list(rates.columns),
+            rates=rates.to_numpy(),
+            files=[FileFingerprint.from_path(csv_path) for csv_path in csv_paths],
+        )
+
+    @classmethod
+    def load(cls, cache_path: Path, csv_paths: List[Path]) -> Optional["RateTable"]:
+        """The table compiled at 'cache_path' if it was compiled from the current 'csv_paths'."""
+        manifest_path = cache_path / "rates.json"
+        if not manifest_path.exists():
+            return None
+
+        manifest = json.loads(manifest_path.read_text())
+        files = [FileFingerprint(**fingerprint) for fingerprint in manifest["files"]]
+
+        if [file.path for file in files] != [str(csv_path.resolve()) for csv_path in csv_paths] or not all(
+            file.matches_stat(csv_path) or file.digest == FileFingerprint.from_path(csv_path).digest
+            for file, csv_path in zip(files, csv_paths)
+        ):
+            return None
+
+        return cls(
+            dates=np.load(cache_path / "dates.npy", mmap_mode="r"),
+            currencies=manifest["currencies"],
+            rates=np.load(cache_path / "rates.npy", mmap_mode="r"),
+            files=files,
+        )
+
+    def save(self, cache_path: Path) -> None:
+        cache_path.mkdir(parents=True, exist_ok=True)
+        np.save(cache_path / "dates.npy", self.dates)
+        np.save(cache_path / "rates.npy", self.rates)
+
+        manifest = {"currencies": self.currencies, "files": [file.dict() for file in self.files]}
+        (cache_path / "rates.json").write_text(json.dumps(manifest, indent=4))
+
+    def rates_at(self, currencies: pd.Series, times: pd.Series) -> np.ndarray:
+        """Rate of every row's currency on its day, in a single as-of lookup for all rows.
+
+        Rows without a currency get no rate, rows in EUR a rate of one.
+        """
+        codes, uniques = pd.factorize(currencies)
+        units = [SUBUNITS.get(currency, (currency, 1.0)) for currency in uniques]
+
+        columns = pd.Index(self.currencies).get_indexer([currency for currency, _ in units])
+        scales = np.array([scale for _, scale in units] + [np.nan])
+        is_base = np.array([currency == BASE_CURRENCY for currency, _ in units] + [False])
+
+        unknown = [
+            currency
+            for currency, column, (unit, _) in zip(uniques, columns, units)
+            if column < 0 and unit != BASE_CURRENCY
+        ]
+        if unknown:
+            raise ValueError(f"There are no exchange rates of {unknown}, only of {self.currencies}.")
+
+        # Factorize marks missing currencies with -1, which selects the trailing 'no currency' entries above.
+        days = pd.to_datetime(times).to_numpy().astype("datetime64[D]")
+        positions = np.searchsorted(self.dates, days, side="right") - 1
+        row_columns = np.append(columns, 0)[codes]
+
+        published = (positions >= 0) & (codes >= 0) & ~is_base[codes]
+        rates = np.full(len(codes), np.nan)
+        rates[published] = self.rates[positions[published], row_columns[published]] * scales[codes][published]
+        rates[is_base[codes]] = 1.0
+
+        missing = (codes >= 0) & np.isnan(rates)
+        if missing.any():
+            raise ValueError(f"There are no exchange rates of {uniques[codes[missing][0]]} on {days[missing][0]}.")
+
+        return rates
+
+
+@lru_cache(maxsize=None)
+def load_rate_table(stats: FileStats, cache_path: Optional[Path]) -> RateTable:
+    """Load or compile the table of the files described by 'stats', memoized per file state."""
+    csv_paths = [Path(path) for path, _, _ in stats]
+    table = None if cache_path is None else RateTable.load(cache_path, csv_paths)
+
+    if table is None:
+        table = RateTable.from_files(csv_paths)
+        if cache_path is not None:
+            table.save(cache_path)
+
+    return table
@@ -14,6 +14,17 @@ class DividendHistory(HistoryModel):
         "Exchange rate",
     ]
     _actions = ["Dividend (Ordinary)"]
+    _dtypes = {
+        "Action": "category",
+        "ISIN": "category",
+        "Ticker": "category",
+        "Name": "category",
+        "No. of shares": "float64",
+        "Price / share": "float64",
+        "Total (EUR)": "float64",
+        "Withholding tax": "float64",
+        "Exchange rate": "float64",
+    }
 
 
 class PositionHistory(HistoryModel):
@@ -29,3 +40,15 @@ class PositionHistory(HistoryModel):
         "Exchange rate",
     ]
     _actions = ["Market buy", "Market sell"]
+    _currency_column = "Currency (Price / share)"
+    _dtypes = {
+        "Action": "category",
+        "ISIN": "category",
+        "Ticker": "category",
+        "Name": "category",
+        "No. of shares": "float64",
+        "Currency (Price / share)": "category",
+        "Price / share": "float64",
+        "Total (EUR)": "float64",
+        "Exchange rate": "float64",
+    }
@@ -0,0 +1,53 @@
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .model import BaseModel
+
+RowRange = Tuple[int, int]
+
+
+class HistoryIndex(BaseModel):
+    """History sorted by ticker, with the row range of every ticker and the rows of every ISIN.
+
+    Rows are stably sorted by ticker only, so a ticker is a single contiguous
+    range with its rows in their original order, also when it was traded under
+    several ISINs. Looking a ticker up is a dict access and a positional slice
+    instead of a query over the history.
+    """
+
+    history: pd.DataFrame
+    tickers: Dict[str, RowRange]
+    isins: Dict[str, np.ndarray]
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def build(cls, history: pd.DataFrame) -> "HistoryIndex":
+        history = history.sort_values("Ticker", kind="stable", ignore_index=True)
+        ticker_values = history["Ticker"].to_numpy()
+        groups = history.groupby("Ticker", sort=False, dropna=False, observed=True).ngroup().to_numpy()
+
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]]) if len(groups) else np.empty(0, dtype=int)
+        stops = np.r_[starts[1:], len(groups)]
+
+        tickers = {
+            ticker_values[start]: (start, stop)
+            for start, stop in zip(starts.tolist(), stops.tolist())
+            if not pd.isna(ticker_values[start])
+        }
+        isins = dict(history.groupby("ISIN", sort=False, observed=True).indices)
+
+        return cls(history=history, tickers=tickers, isins=isins)
+
+    def ticker(self, ticker: str) -> pd.DataFrame:
+        """Rows of 'ticker' in their original order, empty if it isn't in the history."""
+        start, stop = self.tickers.get(ticker, (0, 0))
+
+        return self.history.iloc[start:stop].reset_index(drop=True)
+
+    def isin(self, isin: str) -> pd.DataFrame:
+        """Rows of 'isin' grouped by ticker, empty if it isn't in the history."""
+        return self.history.take(self.isins.get(isin, np.empty(0, dtype=int))).reset_index(drop=True)
@@ -1,34 +1,51 @@
+import asyncio
 import os
 from abc import abstractmethod
 from collections.abc import Callable
-from concurrent.futures import ProcessPoolExecutor
-from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, closing, contextmanager
+from functools import partial, wraps
 from pathlib import Path
-from typing import Iterable, List, Optional, TypeVar
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
 import pandas as pd
-from pydantic import BaseModel as PydanticBaseModel
-from pydantic import Extra, validator
+from pydantic import validator
 
+from .base import BaseModel, concat_histories
+from .profile import profiled, stage
 
-class BaseModel(PydanticBaseModel):
-
-    # Change default config
-    class Config:
-        validate_assignment = True
-        extra = Extra.allow
+if TYPE_CHECKING:
+    from .executor import ReportExecutor
+    from .index import HistoryIndex
+    from .readers import CompiledReader
+    from .shared import SharedHistory
 
 
 class PathModel(BaseModel):
     path: Path
 
     @abstractmethod
-    def exists(self) -> bool:
-        ...  # pragma: no cover
+    def exists(self) -> bool: ...  # pragma: no cover
 
 
 R = TypeVar("R", bound=PathModel)
 
+TIME_COLUMNS = ["DATE", "YEAR", "TAX_YEAR"]
+# Chunks of ticker reports computed ahead of a pipelined consumer, bounds the memory of unconsumed reports.
+PIPELINE_QUEUE_SIZE = 16
+
 funcs = {}
 
 
@@ -48,17 +65,71 @@ def check_existence(func: Callable[[R], pd.DataFrame]) -> Callable[[R], pd.DataF
     return wrapper
 
 
+def limit_to_cpu_count(value: int) -> int:
+    cpu_count = os.cpu_count()
+
+    if cpu_count is None:
+        raise SystemError("Your system has no available cores.")  # pragma: no cover
+
+    return value if value <= cpu_count else cpu_count
+
+
+def normalize_time(history: pd.DataFrame) -> pd.DataFrame:
+    """Parse 'Time' once and derive the date columns every report works with."""
+    time = pd.to_datetime(history["Time"], format="ISO8601").astype("datetime64[ns]")
+    year = time.dt.year.astype("int64")
+
+    return history.assign(Time=time, DATE=time.dt.strftime("%Y-%m-%d"), YEAR=year, TAX_YEAR=year)
+
+
 class HistoryModel(PathModel):
     query: Optional[str] = None
+    broker: Optional[str] = None
+    cache_path: Optional[Path] = None
+    store_path: Optional[Path] = None
+    n_workers: Optional[int] = 1
+    engine: Optional[str] = None
+    chunksize: Optional[int] = None
+    rates_path: Optional[Path] = None
     _columns: Optional[Iterable[str]] = None
     _actions: Optional[Iterable[str]] = None
+    _dtypes: Optional[Dict[str, str]] = None
+    _currency_column: Optional[str] = None
+
+    @validator("engine")
+    @classmethod
+    def check_engine(cls, value: Optional[str]) -> Optional[str]:
+        if value not in (None, "c", "python", "pyarrow"):
+            raise ValueError(f"Unsupported CSV engine {value}.")
+
+        return value
+
+    @validator("broker")
+    @classmethod
+    def check_broker(cls, value: Optional[str]) -> Optional[str]:
+        from .readers import FORMATS
+
+        if value is not None and value not in FORMATS:
+            raise ValueError(f"Unknown broker format {value}, registered are {list(FORMATS)}.")
+
+        return value
+
+    @validator("chunksize")
+    @classmethod
+    def check_chunksize(cls, value: Optional[int], values: Dict[str, Any]) -> Optional[int]:
+        if value is not None and values.get("engine") == "pyarrow":
+            raise ValueError("The 'pyarrow' engine can't read files in chunks.")
+
+        return value
 
     @property
     def columns(self) -> Iterable[str]:
         if self._columns is None:
             raise AttributeError("Property '_columns' must be set by concrete class implementations.")
 
-        return list(set(self._columns) | {"Action"})
+        columns = list(self._columns)
+
+        return ["Action", *[column for column in columns if column != "Action"]]
 
     @property
     def actions(self) -> Iterable[str]:
@@ -68,71 +139,315 @@ class HistoryModel(PathModel):
         return self._actions
 
     @property
-    def read_query(self) -> str:
-        return (
-            f"Action in {list(self.actions)}"
-            if self.query is None
-            else f"Action in {list(self.actions)} and {self.query}"
-        )
+    def dtypes(self) -> Dict[str, str]:
+        return {} if self._dtypes is None else dict(self._dtypes)
+
+    @property
+    def action_query(self) -> str:
+        return f"Action in {list(self.actions)}"
+
+    @property
+    def cache_variant(self) -> List[str]:
+        """How the files are parsed, so cached files parsed differently are never served."""
+        dtypes = [f"{column}:{dtype}" for column, dtype in sorted(self.dtypes.items())]
+
+        return [self.__class__.__name__, self.broker or "auto", *self.columns, self.action_query, *dtypes]
 
     def exists(self) -> bool:
-        return self.path.exists() and self.path.is_dir() and len(list(self.path.iterdir())) > 0
+        return self.path.exists() and self.path.is_dir() and next(self.path.iterdir(), None) is not None
+
+    def filter_history(self, history: pd.DataFrame, query: Optional[str] = None) -> pd.DataFrame:
+        history = normalize_time(history.query(self.action_query))
+
+        return history if query is None else history.query(query)
+
+    def reader(self, csv_path: Path, columns: Iterable[str]) -> "CompiledReader":
+        """Reader of 'columns' of 'csv_path' in the format of 'broker', detected from its header if not set."""
+        from .readers import compile_reader, detect_format
+
+        broker = detect_format(csv_path).name if self.broker is None else self.broker
+
+        return compile_reader(broker, tuple(columns), tuple(self.dtypes.items()))
+
+    def read_file(
+        self, csv_path: Path, columns: Optional[Iterable[str]] = None, query: Optional[str] = None
+    ) -> pd.DataFrame:
+        """Parse 'csv_path' and keep only rows with a relevant action that also match 'query'.
+
+        Rows are normalized to the canonical columns of any broker format. With
+        'chunksize' set the file is parsed in chunks and every chunk is filtered before
+        the next one is read, so irrelevant rows are never held in memory at once.
+        """
+        reader = self.reader(csv_path, self.columns if columns is None else columns)
+
+        if self.chunksize is None:
+            return self.filter_history(reader.read(csv_path, engine=self.engine), query)
+
+        with reader.read_csv(csv_path, engine=self.engine, chunksize=self.chunksize) as chunks:
+            return concat_histories([self.filter_history(reader.normalize(chunk), query) for chunk in chunks])
+
+    def read_files(self, read: Callable[[Path], pd.DataFrame]) -> List[pd.DataFrame]:
+        """Read every file in 'path', concurrently when more than one worker is allowed."""
+        csv_paths = list(self.path.iterdir())
+
+        if self.n_workers == 1 or len(csv_paths) == 1:
+            return [read(csv_path) for csv_path in csv_paths]
+
+        with ThreadPoolExecutor(max_workers=self.n_workers) as pool:
+            return list(pool.map(read, csv_paths))
 
     @check_existence
-    def read(self) -> pd.DataFrame:
-        return pd.concat(
-            [
-                pd.read_csv(
-                    csv_path,
-                    usecols=list(self.columns),
-                ).query(self.read_query)
-                for csv_path in self.path.iterdir()
-            ],
-            ignore_index=True,
+    def ingest(self) -> pd.DataFrame:
+        """Merge new or changed files into the history kept at 'store_path' and return all of it."""
+        if self.store_path is None:
+            raise ValueError(f"Class {self.__class__.__name__} has no 'store_path' to ingest into.")
+
+        from .cache import HistoryStore
+
+        ingest_columns = [*self.columns, "ID"]
+        store = HistoryStore(
+            path=self.store_path, name=self.__class__.__name__, directory=self.path, variant=self.cache_variant
         )
 
+        return store.ingest(self.path.iterdir(), lambda csv_path: self.read_file(csv_path, ingest_columns))
+
+    def convert_currency(self, history: pd.DataFrame, rates_path: Path) -> pd.DataFrame:
+        """Replace the broker's 'Exchange rate' with the rate of the row's currency on its day from 'rates_path'."""
+        if self._currency_column is None:
+            raise ValueError(f"Class {self.__class__.__name__} has no currency column to convert.")
+
+        from .fx import RateTable
+
+        rate_table = RateTable.at(rates_path, None if self.cache_path is None else self.cache_path / "rates")
+
+        return history.assign(**{"Exchange rate": rate_table.rates_at(history[self._currency_column], history.Time)})
+
+    @profiled("history.read")
+    @check_existence
+    def read(self) -> pd.DataFrame:
+        history = self.read_history()
+
+        return history if self.rates_path is None else self.convert_currency(history, self.rates_path)
+
+    def read_history(self) -> pd.DataFrame:
+        if self.store_path is not None:
+            history = self.ingest().drop(columns=["ID", "SOURCE"])
+
+            return history if self.query is None else history.query(self.query).reset_index(drop=True)
+
+        if self.cache_path is None:
+            return concat_histories(self.read_files(partial(self.read_file, query=self.query)))
+
+        from .cache import HistoryCache
+
+        # Cached files are shared by all queries, so the query is applied after loading them.
+        cache = HistoryCache.at(self.cache_path)
+        histories = self.read_files(partial(cache.load, variant=self.cache_variant, parse=self.read_file))
+        cache.save()
+
+        if self.query is not None:
+            histories = [history.query(self.query) for history in histories]
+
+        return concat_histories(histories)
+
+    def read_index(self) -> "HistoryIndex":
+        """Read the history and index it by ticker and ISIN."""
+        from .index import HistoryIndex
+
+        return HistoryIndex.build(self.read())
+
+
+class ReportBatcher:
+    """Regroups per-ticker reports into batches of 'batch_size' rows, skipping empty ones."""
+
+    def __init__(self, batch_size: int) -> None:
+        self.batch_size = batch_size
+        self.pending: List[pd.DataFrame] = []
+        self.n_pending = 0
+
+    def add(self, report: pd.DataFrame) -> List[pd.DataFrame]:
+        """Batches completed by 'report'."""
+        if report.empty:
+            return []
+
+        self.pending.append(report)
+        self.n_pending += len(report)
+        if self.n_pending < self.batch_size:
+            return []
+
+        rows = pd.concat(self.pending, ignore_index=True)
+        n_full = self.n_pending - self.n_pending % self.batch_size
+        batches = [
+            rows.iloc[start : start + self.batch_size].reset_index(drop=True)
+            for start in range(0, n_full, self.batch_size)
+        ]
+
+        self.pending = [rows.iloc[n_full:]] if n_full < self.n_pending else []
+        self.n_pending -= n_full
+
+        return batches
+
+    def flush(self) -> List[pd.DataFrame]:
+        """The last, shorter batch if any rows are left."""
+        return [pd.concat(self.pending, ignore_index=True)] if self.pending else []
+
 
 class ReportModel(BaseModel):
     years: Optional[List[int]] = None
     history: HistoryModel
     n_workers: Optional[int] = None
+    partition_history: Optional[bool] = True
+    share_history: Optional[bool] = False
+    backend: str = "auto"
 
     @validator("n_workers")
     @classmethod
     def limit_amount_of_workers(cls, value: int) -> int:
-        cpu_count = os.cpu_count()
-
-        if cpu_count is None:
-            raise SystemError("Your system has no available cores.")  # pragma: no cover
-
-        return value if value <= cpu_count else cpu_count
+        return limit_to_cpu_count(value)
 
     def add_ticker_to_history_query(self, ticker: str) -> HistoryModel:
         ticker_history = self.history.copy()
 
         ticker_query = f"Ticker == '{ticker}'"
         if self.history.query is not None:
-            ticker_query += f"and {self.history.query}"
+            ticker_query += f" and ({self.history.query})"
         ticker_history.query = ticker_query
 
         return ticker_history
 
+    def report_tickers(self, history: pd.DataFrame) -> List[str]:
+        """Tickers that get a report, by default the ones traded in 'years'."""
+        return list(history.query(f"YEAR in {self.years}").Ticker.dropna().unique())
+
+    def prepare_report(self, history: pd.DataFrame) -> None:
+        """Hook that runs once on the full history before the per-ticker reports are created."""
+
     @abstractmethod
+    def create_report_from_history(
+        self, ticker: str, ticker_history: pd.DataFrame
+    ) -> pd.DataFrame: ...  # pragma: no cover
+
+    def create_ticker_report(self, ticker: str, ticker_history: pd.DataFrame) -> pd.DataFrame:
+        with stage("report.ticker") as stats:
+            stats.rows = len(ticker_history)
+
+            return self.create_report_from_history(ticker=ticker, ticker_history=ticker_history)
+
+    @profiled("report.by_ticker")
     def create_report_by_ticker(self, ticker: str) -> pd.DataFrame:
-        ...  # pragma: no cover
+        ticker_history = self.add_ticker_to_history_query(ticker=ticker)
+
+        return self.create_ticker_report(ticker=ticker, ticker_history=ticker_history.read())
+
+    def create_report_from_shared_history(self, ticker: str, shared_history: "SharedHistory") -> pd.DataFrame:
+        return self.create_ticker_report(ticker=ticker, ticker_history=shared_history.slice(ticker))
 
-    def create_report(self) -> pd.DataFrame:
+    @contextmanager
+    def report_executor(self, executor: Optional["ReportExecutor"] = None) -> Iterator["ReportExecutor"]:
+        """Use the shared 'executor' if one is given, otherwise one that lives for a single report."""
+        from .executor import ReportExecutor
 
+        with ExitStack() as stack:
+            if executor is None:
+                executor = stack.enter_context(ReportExecutor(backend=self.backend, n_workers=self.n_workers))
+
+            yield executor
+
+    def read_report_history(self) -> pd.DataFrame:
+        """Read the history and check that it contains every requested year."""
         history = self.history.read()
-        history.loc[:, "YEAR"] = history.Time.astype("datetime64[ns]").apply(lambda x: x.year).values
         history_years = list(history.YEAR.unique())
 
         if self.years is not None and not set(self.years) <= set(history_years):
             raise ValueError(f"Specified {self.years=} is not contained in history. It only contains {history_years}.")
 
-        tickers_in_years = list(history.query(f"YEAR in {self.years}").Ticker.unique())
+        return history
+
+    @contextmanager
+    def report_tasks(self, history: pd.DataFrame) -> Iterator[Tuple[Callable[..., pd.DataFrame], List[List[Any]]]]:
+        """The per-ticker report function and its arguments, in the order of 'create_report'."""
+        tickers_in_years = self.report_tickers(history)
+        self.prepare_report(history)
+
+        with ExitStack() as stack:
+            yield self.ticker_tasks(tickers_in_years, history, stack)
+
+    def ticker_tasks(
+        self, tickers: List[str], history: pd.DataFrame, stack: ExitStack
+    ) -> Tuple[Callable[..., pd.DataFrame], List[List[Any]]]:
+        """The per-ticker report function and its arguments, 'stack' releases the resources they hold."""
+        if not self.partition_history:
+            return self.create_report_by_ticker, [tickers]
+
+        from .index import HistoryIndex
+
+        history_index = HistoryIndex.build(history)
+
+        if self.share_history:
+            from .shared import SharedHistory
+
+            # Workers map the history and copy only their ticker's rows out of it.
+            shared_history = stack.enter_context(SharedHistory.share(history_index))
+            return self.create_report_from_shared_history, [tickers, [shared_history] * len(tickers)]
+
+        # Partition the already loaded history instead of re-reading it for every ticker.
+        return self.create_ticker_report, [tickers, [history_index.ticker(ticker) for ticker in tickers]]
+
+    def iter_report(self, executor: Optional["ReportExecutor"] = None) -> Generator[pd.DataFrame, None, None]:
+        """Yield the report of every ticker as soon as it is available, in the order of 'create_report'.
+
+        Close the iterator when stopping early, which shuts the pool and its shared history down right away.
+        """
+        history = self.read_report_history()
+
+        with self.report_tasks(history) as (func, tasks), self.report_executor(executor) as report_executor:
+            yield from report_executor.map(func, *tasks, n_rows=len(history))
+
+    async def aiter_report(
+        self, executor: Optional["ReportExecutor"] = None, queue_size: int = PIPELINE_QUEUE_SIZE
+    ) -> AsyncGenerator[pd.DataFrame, None]:
+        """Pipelined 'iter_report', at most 'queue_size' chunks of ticker reports are computed ahead.
+
+        The history is read in a thread, so the event loop keeps serving the other stages.
+        Close the iterator with 'aclose' when stopping early, like 'iter_report'.
+        """
+        history = await asyncio.to_thread(self.read_report_history)
+
+        with self.report_tasks(history) as (func, tasks), self.report_executor(executor) as report_executor:
+            reports = report_executor.amap(func, *tasks, n_rows=len(history), queue_size=queue_size)
+            try:
+                async for report in reports:
+                    yield report
+            finally:
+                await reports.aclose()
+
+    def iter_batches(self, batch_size: int, executor: Optional["ReportExecutor"] = None) -> Iterator[pd.DataFrame]:
+        """Yield the report in batches of 'batch_size' rows, only the last one may be shorter."""
+        batcher = ReportBatcher(batch_size=batch_size)
+
+        with closing(self.iter_report(executor=executor)) as reports:
+            for report in reports:
+                yield from batcher.add(report)
+
+        yield from batcher.flush()
+
+    async def aiter_batches(
+        self, batch_size: int, executor: Optional["ReportExecutor"] = None, queue_size: int = PIPELINE_QUEUE_SIZE
+    ) -> AsyncGenerator[pd.DataFrame, None]:
+        """Pipelined 'iter_batches'."""
+        batcher = ReportBatcher(batch_size=batch_size)
+        reports = self.aiter_report(executor=executor, queue_size=queue_size)
+
+        try:
+            async for report in reports:
+                for batch in batcher.add(report):
+                    yield batch
+        finally:
+            await reports.aclose()
 
-        with ProcessPoolExecutor(max_workers=self.n_workers) as pool:
-            results = pool.map(self.create_report_by_ticker, tickers_in_years)
+        for batch in batcher.flush():
+            yield batch
 
-        return pd.concat(results, ignore_index=True)
+    @profiled("report.create")
+    def create_report(self, executor: Optional["ReportExecutor"] = None) -> pd.DataFrame:
+        return pd.concat(list(self.iter_report(executor=executor)), ignore_index=True)
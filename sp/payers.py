@@ -0,0 +1,66 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Tuple
+
+import pandas as pd
+from pydantic import PrivateAttr
+
+from .model import BaseModel
+
+PAYERS_PATH = Path(__file__).parent / "data" / "payers.csv"
+PAYER_COLUMNS = ["PAYER_ADDRESS", "PAYER_COUNTRY", "RELIEF_STATEMENT"]
+
+Payer = Tuple[str, str, str]
+
+
+class PayerRegistry(BaseModel):
+    """Address, country and relief statement of dividend payers, keyed by ISIN.
+
+    Rows of the registry file with an ISIN describe that fund. Rows without one
+    describe every fund of an 'ISSUER' that isn't listed, matched by the payer
+    name. A payer is resolved once per ISIN and reused by every later report.
+    """
+
+    payers: Dict[str, Payer]
+    issuers: Dict[str, Payer]
+    _resolved: Dict[str, Payer] = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def at(cls, path: Path = PAYERS_PATH) -> "PayerRegistry":
+        """Return the registry stored at 'path', shared by every writer using it in this process."""
+        registry = pd.read_csv(path, dtype=str, keep_default_na=False)
+        by_isin = registry.ISIN != ""
+        payer_values = list(registry[PAYER_COLUMNS].itertuples(index=False, name=None))
+
+        return cls(
+            payers={isin: payer for isin, payer, listed in zip(registry.ISIN, payer_values, by_isin) if listed},
+            issuers={
+                issuer: payer for issuer, payer, listed in zip(registry.ISSUER, payer_values, by_isin) if not listed
+            },
+        )
+
+    def resolve(self, isin: str, name: str) -> Payer:
+        payer = self.payers.get(isin)
+        if payer is not None:
+            return payer
+
+        for issuer, issuer_payer in self.issuers.items():
+            if issuer in name:
+                return issuer_payer
+
+        raise ValueError(f"Payer {name} with ISIN {isin} isn't in the payer registry.")
+
+    def join(self, report: pd.DataFrame) -> pd.DataFrame:
+        """'report' with the payer columns of its 'ISIN', looked up for all rows at once."""
+        unique = report[["ISIN", "NAME"]].drop_duplicates("ISIN")
+
+        for isin, name in zip(unique.ISIN, unique.NAME):
+            if isin not in self._resolved:
+                self._resolved[isin] = self.resolve(isin, name)
+
+        isins = pd.Index(unique.ISIN)
+        payers = pd.DataFrame([self._resolved[isin] for isin in isins], columns=PAYER_COLUMNS)
+        positions = isins.get_indexer(report.ISIN)
+
+        return report.assign(**{column: payers[column].to_numpy()[positions] for column in PAYER_COLUMNS})
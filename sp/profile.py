@@ -0,0 +1,274 @@
+import json
+import os
+import threading
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Generator, Iterable, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+PROC_STATUS_PATH = Path("/proc/self/status")
+PROC_CLEAR_REFS_PATH = Path("/proc/self/clear_refs")
+# Written to 'clear_refs', resets the high-water mark of the resident memory to the current resident memory.
+CLEAR_PEAK_RSS = "5"
+
+
+def peak_rss_mb() -> float:
+    """High-water mark of the resident memory of this process, since the last 'reset_peak_rss'."""
+    # ru_maxrss survives exec, /proc reports the peak of this process image only.
+    if PROC_STATUS_PATH.exists():
+        for line in PROC_STATUS_PATH.read_text(encoding="ascii").splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+
+    import resource  # pragma: no cover
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # pragma: no cover
+
+
+def reset_peak_rss() -> bool:
+    """Reset the high-water mark read by 'peak_rss_mb', where the platform allows it."""
+    try:
+        PROC_CLEAR_REFS_PATH.write_text(CLEAR_PEAK_RSS, encoding="ascii")
+    except OSError:  # pragma: no cover
+        return False
+
+    return True
+
+
+class PeakTracker:
+    """Peak resident memory of every running stage, also of nested and concurrent ones.
+
+    The process has a single high-water mark. It is folded into every running stage
+    and reset whenever a stage starts, so a stage reports the peak reached while it
+    ran instead of the largest peak so far. Where the mark can't be reset, stages
+    report the peak of the whole process.
+    """
+
+    def __init__(self) -> None:
+        self.peaks: Dict[int, float] = {}
+        self._next_key = 0
+        self._lock = Lock()
+
+    def fold(self) -> None:
+        peak = peak_rss_mb()
+        for key, stage_peak in self.peaks.items():
+            self.peaks[key] = max(stage_peak, peak)
+
+    def start(self) -> int:
+        with self._lock:
+            self.fold()
+            reset_peak_rss()
+            key = self._next_key
+            self._next_key += 1
+            self.peaks[key] = 0.0
+
+        return key
+
+    def stop(self, key: int) -> float:
+        with self._lock:
+            self.fold()
+            return self.peaks.pop(key)
+
+
+PEAK_RSS = PeakTracker()
+
+
+class StageStats:
+    """Totals of every run of a stage, '__slots__' keep recording cheap for per-ticker stages."""
+
+    __slots__ = ("calls", "wall_seconds", "cpu_seconds", "rows", "peak_rss_mb")
+
+    def __init__(
+        self,
+        calls: int = 0,
+        wall_seconds: float = 0.0,
+        cpu_seconds: float = 0.0,
+        rows: int = 0,
+        peak_rss_mb: float = 0.0,  # pylint: disable=redefined-outer-name
+    ) -> None:
+        self.calls = calls
+        self.wall_seconds = wall_seconds
+        self.cpu_seconds = cpu_seconds
+        self.rows = rows
+        self.peak_rss_mb = peak_rss_mb
+
+    def add(self, other: "StageStats") -> None:
+        self.calls += other.calls
+        self.wall_seconds += other.wall_seconds
+        self.cpu_seconds += other.cpu_seconds
+        self.rows += other.rows
+        self.peak_rss_mb = max(self.peak_rss_mb, other.peak_rss_mb)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Profile:
+    """Wall time, CPU time, rows and peak memory of every stage of a report run.
+
+    Stages that ran in pool workers are also kept per worker. CPU time is the time
+    of the whole process, so it includes other threads of a thread pool.
+    """
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, StageStats] = {}
+        self.workers: Dict[str, Dict[str, StageStats]] = {}
+        self._lock = Lock()
+
+    def record(self, name: str, stats: StageStats) -> None:
+        # Thread pool workers record into the same profile.
+        with self._lock:
+            self.stages.setdefault(name, StageStats()).add(stats)
+
+    def merge(self, worker: str, stages: Dict[str, StageStats]) -> None:
+        worker_stages = self.workers.setdefault(worker, {})
+
+        for name, stats in stages.items():
+            self.record(name, stats)
+            worker_stages.setdefault(name, StageStats()).add(stats)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stages": {name: stats.to_dict() for name, stats in self.stages.items()},
+            "workers": {
+                worker: {name: stats.to_dict() for name, stats in stages.items()}
+                for worker, stages in self.workers.items()
+            },
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=4)
+
+    def summary(self) -> str:
+        header = f"{'stage':<20}{'calls':>8}{'wall s':>10}{'cpu s':>10}{'rows':>12}{'peak MB':>10}"
+        lines = [header, *self.format_stages(self.stages)]
+
+        for worker, stages in self.workers.items():
+            lines += [f"worker {worker}", *self.format_stages(stages, indent="  ")]
+
+        return "\n".join(lines)
+
+    @staticmethod
+    def format_stages(stages: Dict[str, StageStats], indent: str = "") -> Iterator[str]:
+        for name, stats in stages.items():
+            yield (
+                f"{indent + name:<20}{stats.calls:>8}{stats.wall_seconds:>10.3f}{stats.cpu_seconds:>10.3f}"
+                f"{stats.rows:>12}{stats.peak_rss_mb:>10.1f}"
+            )
+
+
+# Pool threads start with an empty context, so they never record into the profile of another run by accident.
+ACTIVE_PROFILE: ContextVar[Optional[Profile]] = ContextVar("ACTIVE_PROFILE", default=None)
+
+
+def active_profile() -> Optional[Profile]:
+    return ACTIVE_PROFILE.get()
+
+
+@contextmanager
+def profiling(profile: Optional[Profile] = None) -> Iterator[Profile]:
+    """Record every stage run in this context into 'profile' or a new one."""
+    profile = Profile() if profile is None else profile
+    token = ACTIVE_PROFILE.set(profile)
+
+    try:
+        yield profile
+    finally:
+        ACTIVE_PROFILE.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[StageStats]:
+    """Measure the enclosed block as one call of stage 'name', set 'rows' on the yielded stats."""
+    profile = active_profile()
+    stats = StageStats(calls=1)
+
+    if profile is None:
+        yield stats
+        return
+
+    peak = PEAK_RSS.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield stats
+    finally:
+        stats.wall_seconds = time.perf_counter() - wall
+        stats.cpu_seconds = time.process_time() - cpu
+        stats.peak_rss_mb = PEAK_RSS.stop(peak)
+        profile.record(name, stats)
+
+
+def profiled(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Measure every call of the decorated function as stage 'name', counting the rows it returns."""
+
+    def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            with stage(name) as stats:
+                result = func(*args, **kwargs)
+                stats.rows = len(result) if hasattr(result, "__len__") else 0
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def profiled_iter(name: str, iterable: Iterable[T]) -> Generator[T, None, None]:
+    """Measure the time spent producing the items of 'iterable' as a single call of stage 'name'."""
+    profile = active_profile()
+    if profile is None:
+        yield from iterable
+        return
+
+    stats = StageStats(calls=1)
+    iterator = iter(iterable)
+    peak = PEAK_RSS.start()
+
+    try:
+        while True:
+            wall, cpu = time.perf_counter(), time.process_time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                stats.wall_seconds += time.perf_counter() - wall
+                stats.cpu_seconds += time.process_time() - cpu
+
+            stats.rows += len(item) if hasattr(item, "__len__") else 1
+            yield item
+    finally:
+        stats.peak_rss_mb = PEAK_RSS.stop(peak)
+        # Stopping early closes 'iterable' as 'yield from' would.
+        if hasattr(iterator, "close"):
+            iterator.close()
+
+    profile.record(name, stats)
+
+
+class ProfiledTask:
+    """Picklable wrapper that profiles a pool task in its worker and returns its stages with the result."""
+
+    def __init__(self, func: Callable[..., Any]) -> None:
+        self.func = func
+
+    def __call__(self, *args: Any) -> Tuple[Any, str, Dict[str, StageStats]]:
+        with profiling() as profile:
+            result = self.func(*args)
+
+        return result, f"{os.getpid()}/{threading.current_thread().name}", profile.stages
+
+
+def collect_profiles(profile: Profile, results: Iterable[Tuple[T, str, Dict[str, StageStats]]]) -> Iterator[T]:
+    """Merge the worker stages of 'ProfiledTask' results into 'profile' and yield the bare results."""
+    for result, worker, stages in results:
+        profile.merge(worker, stages)
+        yield result
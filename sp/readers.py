@@ -0,0 +1,146 @@
+import csv
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from .model import BaseModel
+
+
+class BrokerFormat(BaseModel):
+    """Layout of the exports of a broker and how it maps to the canonical history schema.
+
+    The canonical schema uses the column names and actions of a Trading212 export,
+    which every report is written against. 'columns' and 'actions' map only what
+    differs, canonical columns the broker doesn't export are filled from 'defaults'.
+    """
+
+    name: str
+    signature: List[str]
+    columns: Dict[str, str] = {}
+    actions: Dict[str, str] = {}
+    defaults: Dict[str, Any] = {}
+    delimiter: str = ","
+    decimal: str = "."
+    time_format: Optional[str] = None
+    na_values: List[str] = []
+
+    def source_column(self, column: str) -> str:
+        return self.columns.get(column, column)
+
+    def matches(self, header: str) -> bool:
+        """Whether the first line of an export has every column of the 'signature'."""
+        columns = next(csv.reader([header], delimiter=self.delimiter), [])
+
+        return set(self.signature) <= set(columns)
+
+
+TRADING212 = BrokerFormat(
+    name="trading212",
+    signature=["Action", "Time", "ISIN", "Ticker", "No. of shares", "Price / share"],
+    # Trading212 fills e.g. the exchange rate of dividends with this marker.
+    na_values=["Not available"],
+)
+
+FORMATS: Dict[str, BrokerFormat] = {}
+
+
+def register_format(broker_format: BrokerFormat) -> BrokerFormat:
+    """Make 'broker_format' available to every history, replacing a format of the same name."""
+    FORMATS[broker_format.name] = broker_format
+    compile_reader.cache_clear()
+
+    return broker_format
+
+
+def detect_format(csv_path: Path) -> BrokerFormat:
+    """The first registered format whose signature matches the header of 'csv_path'."""
+    with open(csv_path, encoding="utf-8-sig") as csv_file:
+        header = csv_file.readline()
+
+    for broker_format in FORMATS.values():
+        if broker_format.matches(header):
+            return broker_format
+
+    raise ValueError(f"File {csv_path} isn't an export of any of the formats {list(FORMATS)}.")
+
+
+class CompiledReader:
+    """Reads exports of a format into the canonical 'columns', with everything but the parsing resolved upfront."""
+
+    __slots__ = ("columns", "read_options", "renames", "actions", "defaults", "time_format")
+
+    def __init__(self, broker_format: BrokerFormat, columns: Iterable[str], dtypes: Dict[str, str]) -> None:
+        self.columns = list(columns)
+        self.defaults = {
+            column: (broker_format.defaults[column], dtypes.get(column))
+            for column in self.columns
+            if column in broker_format.defaults
+        }
+        read_columns = [column for column in self.columns if column not in self.defaults]
+        self.renames = {
+            broker_format.source_column(column): column
+            for column in read_columns
+            if broker_format.source_column(column) != column
+        }
+        self.actions = broker_format.actions if "Action" in read_columns else {}
+        self.time_format = broker_format.time_format if "Time" in read_columns else None
+
+        # Non-default options only, the pyarrow engine rejects e.g. 'decimal'.
+        self.read_options: Dict[str, Any] = {
+            "usecols": [broker_format.source_column(column) for column in read_columns],
+            "dtype": {
+                broker_format.source_column(column): dtype for column, dtype in dtypes.items() if column in read_columns
+            },
+            "na_values": broker_format.na_values,
+        }
+        if broker_format.delimiter != ",":
+            self.read_options["sep"] = broker_format.delimiter
+        if broker_format.decimal != ".":
+            self.read_options["decimal"] = broker_format.decimal
+
+    def read_csv(self, csv_path: Path, **kwargs: Any) -> Any:
+        """Parse 'csv_path' as is, pass 'chunksize' to get an iterator of chunks to 'normalize'."""
+        return pd.read_csv(csv_path, **self.read_options, **kwargs)
+
+    def normalize(self, history: pd.DataFrame) -> pd.DataFrame:
+        """Rename, translate and complete a parsed export to the canonical 'columns' in their order."""
+        if self.renames:
+            history = history.rename(columns=self.renames)
+
+        if self.actions:
+            action = history["Action"]
+            translated = action.map(lambda value: self.actions.get(value, value))
+            if isinstance(action.dtype, pd.CategoricalDtype):
+                # Several source actions may translate to the same canonical one.
+                translated = translated.astype("category")
+            history = history.assign(Action=translated)
+
+        if self.time_format is not None:
+            history = history.assign(Time=pd.to_datetime(history["Time"], format=self.time_format))
+
+        if self.defaults:
+            history = history.assign(
+                **{
+                    column: pd.Series(value, index=history.index, dtype=dtype)
+                    for column, (value, dtype) in self.defaults.items()
+                }
+            )
+
+        return history.reindex(columns=self.columns)
+
+    def read(self, csv_path: Path, **kwargs: Any) -> pd.DataFrame:
+        return self.normalize(self.read_csv(csv_path, **kwargs))
+
+
+@lru_cache(maxsize=None)
+def compile_reader(broker: str, columns: Tuple[str, ...], dtypes: Tuple[Tuple[str, str], ...]) -> CompiledReader:
+    """Compile the reader of 'columns' of 'broker' exports once for every history that reads them."""
+    if broker not in FORMATS:
+        raise ValueError(f"Unknown broker format {broker}, registered are {list(FORMATS)}.")
+
+    return CompiledReader(FORMATS[broker], columns, dict(dtypes))
+
+
+register_format(TRADING212)
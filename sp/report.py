@@ -1,23 +1,23 @@
-from queue import Queue
-from typing import Dict, List, Union
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
 import pandas as pd
+from pydantic import PrivateAttr
 
+from .base import uncategorize
+from .fifo import match_fifo, open_lots
 from .history import DividendHistory, PositionHistory
 from .model import ReportModel
-from .utils import PRECISION_GUARD, BuyAction, SellAction
+from .snapshot import LOT_COLUMNS
+
+if TYPE_CHECKING:
+    from .executor import ReportExecutor
 
 
 class DividendReport(ReportModel):
     history: DividendHistory
 
-    def create_report_by_ticker(self, ticker: str) -> pd.DataFrame:
-        ticker_history = self.add_ticker_to_history_query(ticker=ticker)
-        ticker_history = ticker_history.read()
-        ticker_history.loc[:, "DATE"] = (
-            ticker_history.Time.astype("datetime64[ns]").apply(lambda x: x.date().strftime("%Y-%m-%d")).values
-        )
-        ticker_history.loc[:, "TAX_YEAR"] = ticker_history.DATE.astype("datetime64[ns]").apply(lambda x: x.year).values
+    def create_report_from_history(self, ticker: str, ticker_history: pd.DataFrame) -> pd.DataFrame:
         report = ticker_history.query(f"TAX_YEAR in {self.years}")
 
         report = report[["DATE", "Ticker", "Name", "ISIN", "Total (EUR)", "Withholding tax", "TAX_YEAR"]]
@@ -25,108 +25,222 @@ class DividendReport(ReportModel):
             columns={"Name": "NAME", "Ticker": "TICKER", "Total (EUR)": "TOTAL", "Withholding tax": "TAX"}
         )
 
-        return report
+        # Categorical columns of the history carry the categories of every ticker, the report keeps plain values.
+        return uncategorize(report)
 
 
 class FifoPositionReport(ReportModel):
-    history: PositionHistory
-
-    def create_report_by_ticker(self, ticker: str) -> pd.DataFrame:
-        ticker_history = self.add_ticker_to_history_query(ticker=ticker)
-        ticker_position_history = ticker_history.read().sort_values("Time")
-
-        if "Market sell" not in ticker_position_history["Action"].unique():
-            return pd.DataFrame()
+    """Closed lots of every ticker, paired in a FIFO fashion.
 
-        buy_sell_counts = ticker_position_history.value_counts("Action")
-        buy_queue: Queue[BuyAction] = Queue(buy_sell_counts["Market buy"])
-        sell_queue: Queue[SellAction] = Queue(buy_sell_counts["Market sell"])
+    With a 'snapshot_path' the open lots at the end of the year before the first
+    requested year are persisted, and later runs replay only the fills after it.
+    Only pairs of sells in 'years' are reported then, the same rows a full replay
+    reports for these years.
+    """
 
-        isin = ticker_position_history["ISIN"].unique()[0]
-        name = ticker_position_history["Name"].unique()[0]
-
-        ticker_position_history.loc[:, "Price / share"] = ticker_position_history.loc[
-            :, "Price / share"
-        ] / ticker_position_history.loc[:, "Exchange rate"].astype(float)
-        ticker_position_history.loc[:, "DATE"] = (
-            ticker_position_history.Time.astype("datetime64[ns]").apply(lambda x: x.date().strftime("%Y-%m-%d")).values
+    history: PositionHistory
+    snapshot_path: Optional[Path] = None
+    _opening_year: Optional[int] = PrivateAttr(default=None)
+    _opening_lots: Dict[str, pd.DataFrame] = PrivateAttr(default_factory=dict)
+
+    @property
+    def snapshot_variant(self) -> List[str]:
+        variant = [self.history.__class__.__name__, str(self.history.query), self.history.action_query]
+
+        # Lots hold prices in EUR, so they depend on the rates they were converted with.
+        return variant if self.history.rates_path is None else [*variant, str(self.history.rates_path.resolve())]
+
+    @staticmethod
+    def buy_lots(ticker_history: pd.DataFrame) -> pd.DataFrame:
+        """Buys of a time sorted 'ticker_history' as lots with their price in EUR."""
+        buys = ticker_history[(ticker_history["Action"] == "Market buy").to_numpy()]
+
+        return pd.DataFrame(
+            {
+                "TICKER": buys["Ticker"].to_numpy(dtype=object),
+                "NUM_SHARES": buys["No. of shares"].to_numpy(),
+                "BUY_DATE": buys["DATE"].to_numpy(dtype=object),
+                "BUY_PRICE_PER_SHARE": (buys["Price / share"] / buys["Exchange rate"].astype(float)).to_numpy(),
+            }
         )
-        ticker_position_history = ticker_position_history[["DATE", "No. of shares", "Price / share", "Action"]]
-
-        for _, row in ticker_position_history.iterrows():
-            if row["Action"] == "Market buy":
-                buy_queue.put(
-                    BuyAction(
-                        date=row["DATE"],
-                        num_shares=row["No. of shares"],
-                        price=row["Price / share"],
-                    )
-                )
-            else:
-                sell_queue.put(
-                    SellAction(
-                        date=row["DATE"],
-                        num_shares=row["No. of shares"],
-                        price=row["Price / share"],
-                    )
-                )
 
-        # pair buys and sells in a FIFO fashion
+    def sorted_history(self, ticker_history: pd.DataFrame) -> pd.DataFrame:
+        """'ticker_history' by time, without the fills already contained in the opening lots."""
+        if self._opening_year is not None:
+            ticker_history = ticker_history[(ticker_history["YEAR"] > self._opening_year).to_numpy()]
 
-        sell_action = None
-        buy_action = None
+        return ticker_history.sort_values("Time", kind="stable")
 
-        actions_dict: Dict[str, List[Union[str, float]]] = {
-            "NUM_SHARES": [],
-            "BUY_DATE": [],
-            "BUY_PRICE_PER_SHARE": [],
-            "SELL_DATE": [],
-            "SELL_PRICE_PER_SHARE": [],
-        }
+    def ticker_lots(self, ticker: str, ticker_history: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Buy lots, opening lots first, and sells of a sorted 'ticker_history'."""
+        buys = self.buy_lots(ticker_history)
+        sells = ticker_history[(ticker_history["Action"] == "Market sell").to_numpy()]
 
-        while not (sell_queue.empty() and sell_action is None):
+        opening_lots = self._opening_lots.get(ticker)
+        if opening_lots is not None:
+            buys = pd.concat([opening_lots, buys], ignore_index=True)
 
-            buy_action = buy_queue.get() if not buy_action else buy_action
-            sell_action = sell_queue.get() if not sell_action else sell_action
+        return buys, sells
 
-            if sell_action.num_shares >= buy_action.num_shares:
-                paired_sell_action = sell_action.copy()
-                paired_sell_action.num_shares = buy_action.num_shares
-                action_tuple = (buy_action, paired_sell_action)
+    @staticmethod
+    def remaining_lots(buys: pd.DataFrame, sells: pd.DataFrame) -> pd.DataFrame:
+        remaining, lot_index = open_lots(buy_shares=buys["NUM_SHARES"].to_numpy(), sell_shares=sells["No. of shares"])
 
-                sell_action = sell_action - paired_sell_action
-                if sell_action.num_shares < PRECISION_GUARD:
-                    sell_action = None
-                buy_action = None
-            else:
-                paired_buy_action = buy_action.copy()
-                paired_buy_action.num_shares = sell_action.num_shares
-                action_tuple = (paired_buy_action, sell_action)
+        return buys.iloc[lot_index].assign(NUM_SHARES=remaining).reset_index(drop=True)
 
-                buy_action = buy_action - paired_buy_action
-                if buy_action.num_shares < PRECISION_GUARD:
-                    buy_action = None
-                sell_action = None
+    def create_report_from_history(self, ticker: str, ticker_history: pd.DataFrame) -> pd.DataFrame:
+        ticker_history = self.sorted_history(ticker_history)
+        buys, sells = self.ticker_lots(ticker=ticker, ticker_history=ticker_history)
 
-            current_buy, current_sell = action_tuple
+        if sells.empty:
+            return pd.DataFrame()
 
-            actions_dict["NUM_SHARES"].append(current_sell.num_shares)
+        isin = ticker_history["ISIN"].unique()[0]
+        name = ticker_history["Name"].unique()[0]
 
-            actions_dict["BUY_DATE"].append(current_buy.date)
-            actions_dict["BUY_PRICE_PER_SHARE"].append(current_buy.price)
-            actions_dict["SELL_DATE"].append(current_sell.date)
-            actions_dict["SELL_PRICE_PER_SHARE"].append(current_sell.price)
+        # pair buys and sells in a FIFO fashion
+        num_shares, buy_index, sell_index = match_fifo(
+            buy_shares=buys["NUM_SHARES"].to_numpy(), sell_shares=sells["No. of shares"].to_numpy()
+        )
 
-        report_df = pd.DataFrame(actions_dict)
+        report_df = pd.DataFrame(
+            {
+                "NUM_SHARES": num_shares,
+                "BUY_DATE": buys["BUY_DATE"].to_numpy()[buy_index],
+                "BUY_PRICE_PER_SHARE": buys["BUY_PRICE_PER_SHARE"].to_numpy()[buy_index],
+                "SELL_DATE": sells["DATE"].to_numpy()[sell_index],
+                "SELL_PRICE_PER_SHARE": (sells["Price / share"] / sells["Exchange rate"].astype(float)).to_numpy()[
+                    sell_index
+                ],
+            }
+        )
         report_df.loc[:, ["TICKER", "NAME", "ISIN", "CURRENCY"]] = (
             ticker,
             name,
             isin,
             "EUR",
         )
-        report_df.loc[:, "TAX_YEAR"] = report_df.SELL_DATE.astype("datetime64[ns]").apply(lambda x: x.year).values
+        report_df.loc[:, "TAX_YEAR"] = sells["TAX_YEAR"].to_numpy()[sell_index]
         report_df.loc[:, "RESULT"] = report_df.loc[:, "NUM_SHARES"] * (
             report_df.loc[:, "SELL_PRICE_PER_SHARE"] - report_df.loc[:, "BUY_PRICE_PER_SHARE"]
         )
 
+        if self._opening_year is not None:
+            report_df = report_df[report_df["TAX_YEAR"].isin(self.years).to_numpy()].reset_index(drop=True)
+
         return report_df
+
+    def year_end_lots(self, history: pd.DataFrame, year: int) -> pd.DataFrame:
+        """Open lots of every ticker at the end of 'year', starting from the current opening lots."""
+        history = history[(history["YEAR"] <= year).to_numpy()]
+        ticker_histories = dict(iter(history.groupby("Ticker", sort=False, observed=True)))
+        lots = []
+
+        for ticker in sorted({*self._opening_lots, *ticker_histories}):
+            ticker_history = self.sorted_history(ticker_histories.get(ticker, history.iloc[:0]))
+            lots.append(self.remaining_lots(*self.ticker_lots(ticker=ticker, ticker_history=ticker_history)))
+
+        return pd.concat(lots, ignore_index=True) if lots else pd.DataFrame(columns=LOT_COLUMNS)
+
+    def open_year(self, year: Optional[int], lots: pd.DataFrame) -> None:
+        """Start FIFO matching from 'lots', the open lots at the end of 'year'."""
+        self._opening_year = year
+        self._opening_lots = {
+            ticker: ticker_lots.reset_index(drop=True)
+            for ticker, ticker_lots in lots.groupby("TICKER", sort=False, observed=True)
+        }
+
+    def prepare_report(self, history: pd.DataFrame) -> None:
+        self.open_year(None, pd.DataFrame(columns=LOT_COLUMNS))
+
+        if self.snapshot_path is None or self.years is None:
+            return
+
+        from .snapshot import FifoSnapshots
+
+        store = FifoSnapshots.at(self.snapshot_path)
+        sources = store.sources(sorted(self.history.path.iterdir()))
+        opening_year = min(self.years) - 1
+
+        latest = store.latest(self.snapshot_variant, sources, before=opening_year + 1)
+        if latest is None:
+            # Nothing is open before the history starts.
+            latest, lots = int(history["YEAR"].min()) - 1, pd.DataFrame(columns=LOT_COLUMNS)
+        else:
+            lots = store.load(self.snapshot_variant, latest)
+        self.open_year(latest, lots)
+
+        # Roll the opening lots forward to the requested years, every year end is kept for later runs.
+        for year in range(latest + 1, opening_year + 1):
+            lots = self.year_end_lots(history, year)
+            store.save(self.snapshot_variant, year, sources, lots)
+            self.open_year(year, lots)
+
+        store.save_manifest()
+
+
+class OpenPositionReport(FifoPositionReport):
+    """Lots still open at the end of the last of 'years', or of the history, with their cost basis.
+
+    Sells are matched against buys with the same FIFO engine as the closed lots.
+    Given a 'price_path', a CSV with a 'PRICE' per share in EUR for every 'ISIN'
+    or 'TICKER', the lots are valued against it in a single join.
+    """
+
+    price_path: Optional[Path] = None
+
+    @property
+    def last_year(self) -> Optional[int]:
+        return None if self.years is None else max(self.years)
+
+    def report_tickers(self, history: pd.DataFrame) -> List[str]:
+        if self.last_year is not None:
+            history = history[(history["YEAR"] <= self.last_year).to_numpy()]
+
+        return list(history["Ticker"].dropna().unique())
+
+    def create_report_from_history(self, ticker: str, ticker_history: pd.DataFrame) -> pd.DataFrame:
+        if self.last_year is not None:
+            ticker_history = ticker_history[(ticker_history["YEAR"] <= self.last_year).to_numpy()]
+
+        isin = ticker_history["ISIN"].unique()[0]
+        name = ticker_history["Name"].unique()[0]
+
+        sorted_history = self.sorted_history(ticker_history)
+        lots = self.remaining_lots(*self.ticker_lots(ticker=ticker, ticker_history=sorted_history))
+
+        return pd.DataFrame(
+            {
+                "TICKER": ticker,
+                "NAME": name,
+                "ISIN": isin,
+                "NUM_SHARES": lots["NUM_SHARES"],
+                "BUY_DATE": lots["BUY_DATE"],
+                "BUY_PRICE_PER_SHARE": lots["BUY_PRICE_PER_SHARE"],
+                "CURRENCY": "EUR",
+                "COST_BASIS": lots["NUM_SHARES"] * lots["BUY_PRICE_PER_SHARE"],
+            }
+        )
+
+    def load_prices(self) -> pd.DataFrame:
+        prices = pd.read_csv(self.price_path, dtype={"ISIN": str, "TICKER": str, "PRICE": "float64"})
+
+        if "PRICE" not in prices.columns or not {"ISIN", "TICKER"} & set(prices.columns):
+            raise ValueError(f"Price table {self.price_path} needs a 'PRICE' and an 'ISIN' or 'TICKER' column.")
+
+        return prices
+
+    def value(self, report: pd.DataFrame, prices: pd.DataFrame) -> pd.DataFrame:
+        """Value the open lots of 'report' at 'prices', lots without a price get no value."""
+        key = "ISIN" if "ISIN" in prices.columns else "TICKER"
+        report = report.merge(prices[[key, "PRICE"]], on=key, how="left", validate="many_to_one")
+
+        report["MARKET_VALUE"] = report["NUM_SHARES"] * report["PRICE"]
+        report["UNREALIZED_RESULT"] = report["MARKET_VALUE"] - report["COST_BASIS"]
+
+        return report
+
+    def create_report(self, executor: Optional["ReportExecutor"] = None) -> pd.DataFrame:
+        report = super().create_report(executor=executor)
+
+        return report if self.price_path is None else self.value(report, self.load_prices())
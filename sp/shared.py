@@ -0,0 +1,57 @@
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator
+
+import pandas as pd
+import pyarrow as pa
+
+from .index import HistoryIndex, RowRange
+from .model import BaseModel
+
+# RAM backed on Linux, so the mapped history never has to touch a disk.
+SHARED_MEMORY_ROOT = Path("/dev/shm")
+
+
+def open_table(path: Path) -> pa.Table:
+    """Memory map the Arrow IPC file at 'path', columns are not copied.
+
+    Mapping only reads the file footer, so it is done for every slice instead of
+    being cached. No mapping outlives the slices taken from it, and reused workers
+    never keep the file of a finished report mapped after it was removed.
+    """
+    return pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+
+
+class SharedHistory(BaseModel):
+    """History written once to a memory-mapped Arrow IPC file and sliced by ticker in the workers.
+
+    Rows are written in the order of the history index, so every ticker is a
+    contiguous row range. Workers only receive the file path and the ranges, attach to the mapped file and copy
+    nothing but their own slice, so memory doesn't grow with the amount of workers.
+    """
+
+    path: Path
+    ranges: Dict[str, RowRange]
+
+    @classmethod
+    @contextmanager
+    def share(cls, history_index: HistoryIndex) -> Iterator["SharedHistory"]:
+        """Share the indexed history for the duration of the context and remove it afterwards."""
+        root = SHARED_MEMORY_ROOT if SHARED_MEMORY_ROOT.is_dir() else None
+
+        with tempfile.TemporaryDirectory(prefix="sp-history-", dir=root) as directory:
+            yield cls.create(history_index, Path(directory) / "history.arrow")
+
+    @classmethod
+    def create(cls, history_index: HistoryIndex, path: Path) -> "SharedHistory":
+        table = pa.Table.from_pandas(history_index.history, preserve_index=False)
+        with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        return cls(path=path, ranges=history_index.tickers)
+
+    def slice(self, ticker: str) -> pd.DataFrame:
+        start, stop = self.ranges[ticker]
+
+        return open_table(self.path).slice(start, stop - start).to_pandas()
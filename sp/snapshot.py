@@ -0,0 +1,121 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+from .cache import FileFingerprint
+from .model import BaseModel
+from .readers import compile_reader, detect_format
+
+LOT_COLUMNS = ["TICKER", "NUM_SHARES", "BUY_DATE", "BUY_PRICE_PER_SHARE"]
+
+
+def first_year(csv_path: Path) -> Optional[int]:
+    """Earliest year in the export at 'csv_path', None if it has no rows."""
+    # Times are ISO strings unless the format parses them, both order chronologically.
+    times = compile_reader(detect_format(csv_path).name, ("Time",), ()).read(csv_path)["Time"].dropna()
+
+    return None if times.empty else pd.Timestamp(times.min()).year
+
+
+class SourceFile(FileFingerprint):
+    first_year: Optional[int]
+
+    @classmethod
+    def from_path(cls, path: Path) -> "SourceFile":
+        return cls(**FileFingerprint.from_path(path).dict(), first_year=first_year(path))
+
+    def affects(self, year: int) -> bool:
+        """Whether the file holds rows of 'year' or earlier, so it changes the open lots at the end of 'year'."""
+        return self.first_year is not None and self.first_year <= year
+
+
+class FifoSnapshots(BaseModel):
+    """Open FIFO lots of every ticker at the end of a year, persisted between runs.
+
+    A snapshot remembers the digests of the input files with rows up to its year.
+    It stays valid as long as exactly these files, unchanged, hold such rows, so new
+    exports of later years keep the snapshots of earlier years usable.
+    """
+
+    path: Path
+    files: Dict[str, SourceFile] = {}
+    snapshots: Dict[str, Dict[int, Dict[str, str]]] = {}
+
+    @classmethod
+    def at(cls, path: Path) -> "FifoSnapshots":
+        store = cls(path=path)
+        store.path.mkdir(parents=True, exist_ok=True)
+
+        if store.manifest_path.exists():
+            manifest = json.loads(store.manifest_path.read_text())
+            store.files, store.snapshots = manifest["files"], manifest["snapshots"]
+
+        return store
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.path / "snapshots.json"
+
+    @staticmethod
+    def variant_key(variant: Iterable[str]) -> str:
+        return hashlib.sha256("|".join(variant).encode()).hexdigest()
+
+    def lots_path(self, variant_key: str, year: int) -> Path:
+        return self.path / f"{variant_key}-{year}.parquet"
+
+    def sources(self, csv_paths: Iterable[Path]) -> Dict[str, SourceFile]:
+        """Describe the current input files, only new or changed files are hashed and read."""
+        sources = {}
+
+        for csv_path in csv_paths:
+            source = str(csv_path.resolve())
+            known = self.files.get(source)
+
+            if known is not None and known.matches_stat(csv_path):
+                sources[source] = known
+                continue
+
+            fingerprint = FileFingerprint.from_path(csv_path)
+            if known is not None and fingerprint.digest == known.digest:
+                sources[source] = SourceFile(**fingerprint.dict(), first_year=known.first_year)
+            else:
+                sources[source] = SourceFile(**fingerprint.dict(), first_year=first_year(csv_path))
+
+        self.files = sources
+        return sources
+
+    @staticmethod
+    def affecting(sources: Dict[str, SourceFile], year: int) -> Dict[str, str]:
+        return {source: file.digest for source, file in sources.items() if file.affects(year)}
+
+    def latest(self, variant: Iterable[str], sources: Dict[str, SourceFile], before: int) -> Optional[int]:
+        """The latest year before 'before' with a snapshot that is valid for 'sources'."""
+        variant_key = self.variant_key(variant)
+        snapshots = self.snapshots.get(variant_key, {})
+
+        valid = [
+            year
+            for year, digests in snapshots.items()
+            if year < before and digests == self.affecting(sources, year) and self.lots_path(variant_key, year).exists()
+        ]
+
+        return max(valid, default=None)
+
+    def load(self, variant: Iterable[str], year: int) -> pd.DataFrame:
+        return pd.read_parquet(self.lots_path(self.variant_key(variant), year))
+
+    def save(self, variant: Iterable[str], year: int, sources: Dict[str, SourceFile], lots: pd.DataFrame) -> None:
+        variant_key = self.variant_key(variant)
+
+        lots[LOT_COLUMNS].to_parquet(self.lots_path(variant_key, year), index=False)
+        self.snapshots.setdefault(variant_key, {})[year] = self.affecting(sources, year)
+
+    def save_manifest(self) -> None:
+        manifest = {
+            "files": {source: file.dict() for source, file in self.files.items()},
+            "snapshots": self.snapshots,
+        }
+        self.manifest_path.write_text(json.dumps(manifest, indent=4))
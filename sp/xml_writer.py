@@ -1,15 +1,74 @@
+import asyncio
 import json
+import os
+import threading
+from contextlib import closing, contextmanager, nullcontext
 from pathlib import Path
-from typing import Optional
-from xml.etree.ElementTree import Element, ElementTree, SubElement, indent
+from typing import IO, Any, Dict, Generator, Iterator, NamedTuple, Optional, Tuple
+from xml.etree.ElementTree import Element, ElementTree, SubElement, indent, tostring
 
 import pandas as pd
 from pydantic import parse_obj_as
 
+from .executor import ReportExecutor
 from .history import DividendHistory
-from .model import BaseModel
+from .model import PIPELINE_QUEUE_SIZE, BaseModel
+from .payers import PAYERS_PATH, PayerRegistry
+from .profile import profiled_iter, stage
 from .report import DividendReport
 
+# Encoding ElementTree writes by default, non-ASCII characters become character references.
+XML_ENCODING = "us-ascii"
+DIVIDEND_INDENT = b"    "
+# Dividends taken from the report at once, bounds the memory used by the report itself.
+REPORT_BATCH_SIZE = 1_000
+
+
+@contextmanager
+def atomic_open(path: Path, mode: str, **kwargs: Any) -> Iterator[IO[Any]]:
+    """Open a temporary file next to 'path' that replaces it only once the context exits without an error.
+
+    A failed run leaves neither a partial file nor the temporary one behind.
+    """
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+
+    try:
+        with temp_path.open(mode, **kwargs) as file:
+            yield file
+        os.replace(temp_path, path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+class DividendRecord(NamedTuple):
+    """Text of the fields of a dividend, as it is written to the XML."""
+
+    date: str
+    isin: str
+    name: str
+    payer_address: str
+    payer_country: str
+    value: str
+    foreign_tax: str
+    relief_statement: str
+
+
+def dividend_records(report: pd.DataFrame) -> Iterator[DividendRecord]:
+    """Records of the dividends in 'report', every field converted to text column by column."""
+    # 'tolist' returns Python objects, so amounts are formatted exactly as 'str' of a single value.
+    columns = [
+        report.DATE.tolist(),
+        report.ISIN.tolist(),
+        report.NAME.tolist(),
+        report.PAYER_ADDRESS.tolist(),
+        report.PAYER_COUNTRY.tolist(),
+        [str(value) for value in report.TOTAL.tolist()],
+        [str(value) for value in report.TAX.tolist()],
+        report.RELIEF_STATEMENT.tolist(),
+    ]
+
+    return map(DividendRecord._make, zip(*columns))
+
 
 class BaseInfo(BaseModel):
     tax_number: str
@@ -69,85 +128,117 @@ class PersonalInfo(BaseModel):
     def from_file(cls, path: Path) -> "PersonalInfo":
         return parse_obj_as(cls, json.loads(path.read_text()))
 
+    @classmethod
+    def from_file_cached(cls, path: Path) -> "PersonalInfo":
+        """Parse 'path' only if it changed since it was last parsed by any writer in this process."""
+        key = path.resolve()
+        mtime_ns = key.stat().st_mtime_ns
+
+        cached = PERSONAL_INFO_CACHE.get(key)
+        if cached is None or cached[0] != mtime_ns:
+            cached = (mtime_ns, cls.from_file(key))
+            PERSONAL_INFO_CACHE[key] = cached
+
+        return cached[1]
+
+
+PERSONAL_INFO_CACHE: Dict[Path, Tuple[int, PersonalInfo]] = {}
+
 
 class DivDohXML(BaseModel):
     personal_info_path: Path
     input_path: Path
     output_path: Path
     write_csv_report: Optional[bool] = True
+    cache_path: Optional[Path] = None
+    stream: Optional[bool] = False
+    batch_size: int = REPORT_BATCH_SIZE
+    payers_path: Optional[Path] = None
+    pipeline: Optional[bool] = False
+    queue_size: int = PIPELINE_QUEUE_SIZE
 
     @property
     def personal_info(self) -> PersonalInfo:
-        return PersonalInfo.from_file(self.personal_info_path)
+        return PersonalInfo.from_file_cached(self.personal_info_path)
+
+    @property
+    def payer_registry(self) -> PayerRegistry:
+        return PayerRegistry.at(PAYERS_PATH if self.payers_path is None else self.payers_path)
 
     def create_header(self, root: Element) -> Element:
         header = SubElement(root, "edp:Header")
 
         taxpayer_child = SubElement(header, "edp:taxpayer")
 
-        for name, value in self.personal_info.base_info:
-            SubElement(taxpayer_child, f"edp:{self.personal_info.base_info.attr_conversion(name)}").text = value
+        base_info = self.personal_info.base_info
+        for name, value in base_info:
+            SubElement(taxpayer_child, f"edp:{base_info.attr_conversion(name)}").text = value
 
         workflow = SubElement(header, "edp:Workflow")
         SubElement(workflow, "edp:DocumentWorkflowID").text = "O"
 
         return root
 
-    def load_report(self) -> pd.DataFrame:
+    @property
+    def csv_report_path(self) -> Path:
+        return self.output_path.parent / "report.csv"
 
+    def dividend_report(self) -> DividendReport:
         year = int(self.personal_info.doh_div_info.period)
 
-        div_report = DividendReport(
+        return DividendReport(
             years=[year],
-            history=DividendHistory(path=self.input_path),
+            history=DividendHistory(path=self.input_path, cache_path=self.cache_path),
         )
 
-        report = div_report.create_report()
+    def iter_report(self, executor: Optional[ReportExecutor] = None) -> Generator[pd.DataFrame, None, None]:
+        """Yield the dividend report in batches and append every batch to 'report.csv' on the way."""
+        div_report = self.dividend_report()
+        batches = profiled_iter("xml.load", div_report.iter_batches(batch_size=self.batch_size, executor=executor))
+
+        if not self.write_csv_report:
+            yield from batches
+            return
 
-        if self.write_csv_report:
-            path = self.output_path.parent / "report.csv"
-            report.to_csv(path_or_buf=path, index=False)
+        with atomic_open(self.csv_report_path, "w", newline="") as csv_file, closing(batches):
+            for number, batch in enumerate(batches):
+                batch.to_csv(path_or_buf=csv_file, index=False, header=number == 0)
+                yield batch
 
-        return report
+    def iter_dividends(self, executor: Optional[ReportExecutor] = None) -> Generator[pd.DataFrame, None, None]:
+        """Yield the report batches with the payer of every dividend joined on."""
+        with closing(self.iter_report(executor=executor)) as batches:
+            for batch in batches:
+                yield self.payer_registry.join(batch)
 
     def create_doh_div_root(self, envelope: Element) -> Element:
         doh_div_root = SubElement(envelope, "body")
         doh_div_child = SubElement(doh_div_root, "Doh_Div")
 
-        for name, value in self.personal_info.doh_div_info:
+        doh_div_info = self.personal_info.doh_div_info
+        for name, value in doh_div_info:
             if isinstance(value, bool):
                 value = str(int(value))
 
-            SubElement(doh_div_child, self.personal_info.doh_div_info.attr_conversion(name)).text = value
+            SubElement(doh_div_child, doh_div_info.attr_conversion(name)).text = value
 
         return doh_div_root
 
-    def add_dividend(self, dividend_root: Element, row: pd.Series) -> None:
+    def add_dividend(self, dividend_root: Element, record: DividendRecord) -> None:
         divident_item = SubElement(dividend_root, "Dividend")
-        SubElement(divident_item, "Date").text = row.DATE
-        SubElement(divident_item, "PayerIdentificationNumber").text = row.ISIN
-        SubElement(divident_item, "PayerName").text = row.NAME
-
-        if "Vanguard" in row.NAME:  # TODO
-            address = "Europadamm 2-6, 41460 Neuss, Germany"
-            country = "Germany"
-            statement = "192/2006, 10. člen"
-        elif "iShares" in row.NAME:
-            address = "2 Ballsbridge Park, Ballsbridge, Dublin, D04 YW83"
-            country = "Ireland"
-            statement = "96/2002, 10. člen"
-        else:
-            raise ValueError
-
-        SubElement(divident_item, "PayerAddress").text = address
-        SubElement(divident_item, "PayerCountry").text = country
+        SubElement(divident_item, "Date").text = record.date
+        SubElement(divident_item, "PayerIdentificationNumber").text = record.isin
+        SubElement(divident_item, "PayerName").text = record.name
+
+        SubElement(divident_item, "PayerAddress").text = record.payer_address
+        SubElement(divident_item, "PayerCountry").text = record.payer_country
         SubElement(divident_item, "Type").text = "1"
-        SubElement(divident_item, "Value").text = str(row.TOTAL)
-        SubElement(divident_item, "ForeignTax").text = str(row.TAX)
-        SubElement(divident_item, "SourceCountry").text = country
-        SubElement(divident_item, "ReliefStatement").text = statement
+        SubElement(divident_item, "Value").text = record.value
+        SubElement(divident_item, "ForeignTax").text = record.foreign_tax
+        SubElement(divident_item, "SourceCountry").text = record.payer_country
+        SubElement(divident_item, "ReliefStatement").text = record.relief_statement
 
-    def write(self) -> None:
+    def create_envelope(self) -> Tuple[Element, Element]:
         root = Element(
             "Envelope",
             {
@@ -161,11 +252,111 @@ class DivDohXML(BaseModel):
         SubElement(envelope, "edp:Signatures")
         dividend_root = self.create_doh_div_root(envelope=envelope)
 
-        report = self.load_report()
-
-        for _, row in report.iterrows():
-            self.add_dividend(dividend_root=dividend_root, row=row)
-
-        tree = ElementTree(element=root)
-        indent(tree)
-        tree.write(self.output_path)
+        return root, dividend_root
+
+    def write(self, executor: Optional[ReportExecutor] = None) -> None:
+        """Write the report, computing it on the shared 'executor' if one is given."""
+        with stage("xml.write"):
+            if self.pipeline:
+                asyncio.run(self.write_pipeline(executor=executor))
+                return
+
+            if self.stream:
+                self.write_stream(executor=executor)
+                return
+
+            root, dividend_root = self.create_envelope()
+
+            with closing(self.iter_dividends(executor=executor)) as batches:
+                for batch in batches:
+                    for record in dividend_records(batch):
+                        self.add_dividend(dividend_root=dividend_root, record=record)
+
+            tree = ElementTree(element=root)
+            indent(tree)
+            with atomic_open(self.output_path, "wb") as xml_file:
+                tree.write(xml_file)
+
+    def stream_envelope(self) -> Tuple[bytes, bytes]:
+        """The serialized envelope with an empty body, split where the dividends belong."""
+        root, _ = self.create_envelope()
+        indent(root)
+        head, tail = tostring(root, encoding=XML_ENCODING).split(b"</Doh_Div>")
+
+        return head + b"</Doh_Div>", tail
+
+    def serialize_dividends(self, batch: pd.DataFrame) -> bytes:
+        """The dividends of 'batch' as they appear in the document written by 'write'."""
+        dividend_root = Element("body")
+        dividends = []
+
+        for record in dividend_records(batch):
+            self.add_dividend(dividend_root=dividend_root, record=record)
+            dividend = dividend_root[0]
+            dividend_root.remove(dividend)
+
+            indent(dividend, level=2)
+            dividends.append(b"\n" + DIVIDEND_INDENT + tostring(dividend, encoding=XML_ENCODING))
+
+        return b"".join(dividends)
+
+    def write_stream(self, executor: Optional[ReportExecutor] = None) -> None:
+        """Write the same document as 'write', but serialize every batch of dividends as soon as it is created.
+
+        Only the envelope and the current report batch are kept in memory. The envelope
+        is serialized with an empty body and split where the dividends belong, which
+        keeps the output byte identical.
+        """
+        head, tail = self.stream_envelope()
+
+        with atomic_open(self.output_path, "wb") as xml_file, closing(
+            self.iter_dividends(executor=executor)
+        ) as batches:
+            xml_file.write(head)
+
+            for batch in batches:
+                xml_file.write(self.serialize_dividends(batch))
+
+            xml_file.write(tail)
+
+    def write_batch(self, batch: pd.DataFrame, number: int, xml_file: IO[bytes], csv_file: Optional[IO[str]]) -> None:
+        if csv_file is not None:
+            batch.to_csv(path_or_buf=csv_file, index=False, header=number == 0)
+
+        xml_file.write(self.serialize_dividends(self.payer_registry.join(batch)))
+
+    async def write_pipeline(self, executor: Optional[ReportExecutor] = None) -> None:
+        """Write the same files as 'write_stream', with computing and writing overlapped.
+
+        Ticker reports are computed by the executor at most 'queue_size' ahead of the
+        writer, and every batch is written in a thread while the next one is collected.
+        A ticker's report needs its rows of every file, so reading still completes
+        before the first report is computed.
+        """
+        head, tail = self.stream_envelope()
+        div_report = self.dividend_report()
+        csv_context = atomic_open(self.csv_report_path, "w", newline="") if self.write_csv_report else nullcontext()
+
+        with atomic_open(self.output_path, "wb") as xml_file, csv_context as csv_file:
+            xml_file.write(head)
+            output: Optional["asyncio.Future[None]"] = None
+            batches = div_report.aiter_batches(
+                batch_size=self.batch_size, executor=executor, queue_size=self.queue_size
+            )
+
+            try:
+                number = 0
+                async for batch in batches:
+                    # A single batch is written at a time, which keeps the output in order.
+                    if output is not None:
+                        await output
+                    output = asyncio.ensure_future(
+                        asyncio.to_thread(self.write_batch, batch, number, xml_file, csv_file)
+                    )
+                    number += 1
+            finally:
+                await batches.aclose()
+                if output is not None:
+                    await output
+
+            xml_file.write(tail)
@@ -0,0 +1,31 @@
+import json
+from pathlib import Path
+
+from sp._testing.env import HISTORY_DATA_ROOT, TEST_DATA_ROOT
+from sp.batch import DivDohBatch
+
+
+def write_manifest(tmp_path: Path) -> Path:
+    config_path = TEST_DATA_ROOT / "test_xml_writer" / "test_write" / "test_config.json"
+    manifest_path = tmp_path / "manifest.json"
+
+    jobs = [
+        {"taxpayer_info": str(config_path), "data_path": str(HISTORY_DATA_ROOT), "xml_path": "first/output.xml"},
+        {"taxpayer_info": str(config_path), "data_path": "missing", "xml_path": "second/output.xml"},
+        {"taxpayer_info": str(config_path), "data_path": str(HISTORY_DATA_ROOT), "xml_path": "third/output.xml"},
+    ]
+    for job in jobs:
+        (tmp_path / job["xml_path"]).parent.mkdir()
+    manifest_path.write_text(json.dumps({"jobs": jobs}))
+
+    return manifest_path
+
+
+def test_failed_job_does_not_stop_batch(tmp_path: Path) -> None:
+    batch = DivDohBatch.from_file(write_manifest(tmp_path), n_workers=2)
+
+    results = batch.run()
+
+    assert [result.failed for result in results] == [False, True, False]
+    assert results[1].error is not None and "doesn't exist" in results[1].error
+    assert (tmp_path / "first" / "output.xml").read_bytes() == (tmp_path / "third" / "output.xml").read_bytes()
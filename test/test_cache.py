@@ -0,0 +1,204 @@
+import os
+import shutil
+from pathlib import Path
+from typing import Iterable, List, Optional, Type
+
+import pandas as pd
+import pytest
+
+from sp._testing.env import HISTORY_DATA_ROOT
+from sp.cache import FileFingerprint, HistoryCache
+from sp.history import DividendHistory, PositionHistory
+from sp.model import HistoryModel
+
+
+def test_cached_read_matches_uncached_read(tmp_path: Path) -> None:
+    cache_path = tmp_path / "cache"
+
+    history = PositionHistory(path=HISTORY_DATA_ROOT).read()
+    cached_history = PositionHistory(path=HISTORY_DATA_ROOT, cache_path=cache_path).read()
+    reloaded_history = PositionHistory(path=HISTORY_DATA_ROOT, cache_path=cache_path).read()
+
+    pd.testing.assert_frame_equal(history, cached_history)
+    pd.testing.assert_frame_equal(history, reloaded_history)
+
+    cache = HistoryCache.at(cache_path)
+    assert (cache.hits, cache.misses) == (3, 3)
+
+
+def test_history_classes_do_not_share_entries(tmp_path: Path) -> None:
+    cache_path = tmp_path / "cache"
+
+    _ = PositionHistory(path=HISTORY_DATA_ROOT, cache_path=cache_path).read()
+    dividends = DividendHistory(path=HISTORY_DATA_ROOT, cache_path=cache_path).read()
+
+    assert set(dividends.Action.unique()) == {"Dividend (Ordinary)"}
+    assert HistoryCache.at(cache_path).misses == 6
+
+
+def test_only_changed_files_are_rebuilt(tmp_path: Path) -> None:
+    data_path = tmp_path / "data"
+    cache_path = tmp_path / "cache"
+    shutil.copytree(HISTORY_DATA_ROOT, data_path)
+
+    _ = DividendHistory(path=data_path, cache_path=cache_path).read()
+
+    # Touching a file without changing its content is still a hit.
+    touched = data_path / "test_2020.csv"
+    os.utime(touched, ns=(touched.stat().st_atime_ns, touched.stat().st_mtime_ns + 10**9))
+
+    changed = data_path / "test_2022.csv"
+    changed.write_text("\n".join(changed.read_text().splitlines()[:-1]))
+
+    history = DividendHistory(path=data_path, cache_path=cache_path).read()
+
+    cache = HistoryCache.at(cache_path)
+    assert (cache.hits, cache.misses) == (2, 4)
+    pd.testing.assert_frame_equal(history, DividendHistory(path=data_path).read())
+
+
+def test_manifest_persists(tmp_path: Path) -> None:
+    cache_path = tmp_path / "cache"
+
+    _ = DividendHistory(path=HISTORY_DATA_ROOT, cache_path=cache_path).read()
+
+    manifest = HistoryCache(path=cache_path).manifest_path
+    assert manifest.exists()
+    assert FileFingerprint.from_path(HISTORY_DATA_ROOT / "test_2021.csv").digest in manifest.read_text()
+
+    HistoryCache.at(cache_path).clear()
+    assert not list(cache_path.glob("*.parquet"))
+
+
+def test_ingest_parses_only_new_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    data_path = tmp_path / "data"
+    store_path = tmp_path / "store"
+    data_path.mkdir()
+
+    parsed: List[str] = []
+    read_file = PositionHistory.read_file
+
+    def tracked_read_file(
+        self: PositionHistory, csv_path: Path, columns: Optional[Iterable[str]] = None, query: Optional[str] = None
+    ) -> pd.DataFrame:
+        parsed.append(csv_path.name)
+        return read_file(self, csv_path, columns, query)
+
+    monkeypatch.setattr(PositionHistory, "read_file", tracked_read_file)
+
+    history = PositionHistory(path=data_path, store_path=store_path)
+    for year in [2020, 2021]:
+        shutil.copy(HISTORY_DATA_ROOT / f"test_{year}.csv", data_path)
+    _ = history.ingest()
+
+    shutil.copy(HISTORY_DATA_ROOT / "test_2022.csv", data_path)
+    ingested = history.ingest()
+
+    assert sorted(parsed) == ["test_2020.csv", "test_2021.csv", "test_2022.csv"]
+    assert len(ingested) == len(PositionHistory(path=HISTORY_DATA_ROOT).read())
+    assert ingested.Time.is_monotonic_increasing
+
+
+@pytest.mark.parametrize("history_class", [DividendHistory, PositionHistory])
+def test_ingest_drops_overlapping_rows(tmp_path: Path, history_class: Type[HistoryModel]) -> None:
+    data_path = tmp_path / "data"
+    store_path = tmp_path / "store"
+    shutil.copytree(HISTORY_DATA_ROOT, data_path)
+
+    history = history_class(path=data_path, store_path=store_path)
+    expected = history.read()
+
+    overlap = pd.read_csv(data_path / "test_2022.csv").head(100)
+    overlap.to_csv(data_path / "test_2022_overlap.csv", index=False)
+
+    assert len(history.read()) == len(expected)
+    assert not history.ingest().ID.dropna().duplicated().any()
+
+
+def test_ingest_replaces_rows_of_changed_and_removed_files(tmp_path: Path) -> None:
+    data_path = tmp_path / "data"
+    store_path = tmp_path / "store"
+    shutil.copytree(HISTORY_DATA_ROOT, data_path)
+
+    history = DividendHistory(path=data_path, store_path=store_path)
+    _ = history.ingest()
+
+    (data_path / "test_2020.csv").unlink()
+    changed = data_path / "test_2022.csv"
+    changed.write_text("\n".join(changed.read_text().splitlines()[:-20]))
+
+    ingested = history.read()
+    expected = DividendHistory(path=data_path).read().sort_values("Time", kind="stable", ignore_index=True)
+
+    pd.testing.assert_frame_equal(ingested, expected[ingested.columns], check_categorical=False)
+
+
+def test_ingest_requires_store_path() -> None:
+    with pytest.raises(ValueError):
+        _ = DividendHistory(path=HISTORY_DATA_ROOT).ingest()
+
+
+@pytest.mark.parametrize("history_class", [DividendHistory, PositionHistory])
+def test_ingest_keeps_rows_when_an_overlapping_export_changes(
+    tmp_path: Path, history_class: Type[HistoryModel]
+) -> None:
+    data_path = tmp_path / "data"
+    data_path.mkdir()
+
+    export = pd.read_csv(HISTORY_DATA_ROOT / "test_2020.csv")
+    export.iloc[:400].to_csv(data_path / "a.csv", index=False)
+    export.iloc[200:].to_csv(data_path / "b.csv", index=False)
+
+    history = history_class(path=data_path, store_path=tmp_path / "store")
+    _ = history.read()
+
+    # The rows 200-400 were kept from 'a.csv' and must come back from 'b.csv'.
+    export.iloc[:150].to_csv(data_path / "a.csv", index=False)
+
+    ingested = history.read()
+    expected = history_class(path=data_path).read().sort_values("Time", kind="stable", ignore_index=True)
+
+    pd.testing.assert_frame_equal(ingested, expected[ingested.columns], check_categorical=False)
+    assert history_class(path=data_path, store_path=tmp_path / "fresh").read().equals(ingested)
+
+
+def test_ingest_keeps_directories_sharing_a_store_apart(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    store_path = tmp_path / "store"
+    for year in [2020, 2021]:
+        (tmp_path / str(year)).mkdir()
+        shutil.copy(HISTORY_DATA_ROOT / f"test_{year}.csv", tmp_path / str(year))
+
+    histories = [PositionHistory(path=tmp_path / str(year), store_path=store_path) for year in [2020, 2021]]
+    expected = [len(PositionHistory(path=history.path).read()) for history in histories]
+
+    parsed: List[str] = []
+    read_file = PositionHistory.read_file
+
+    def tracked_read_file(
+        self: PositionHistory, csv_path: Path, columns: Optional[Iterable[str]] = None, query: Optional[str] = None
+    ) -> pd.DataFrame:
+        parsed.append(csv_path.name)
+        return read_file(self, csv_path, columns, query)
+
+    monkeypatch.setattr(PositionHistory, "read_file", tracked_read_file)
+
+    for _ in range(2):
+        assert [len(history.read()) for history in histories] == expected
+
+    # Neither directory removes the parts of the other one.
+    assert sorted(parsed) == ["test_2020.csv", "test_2021.csv"]
+
+
+def test_ingest_parses_again_when_the_variant_changes(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    data_path = tmp_path / "data"
+    shutil.copytree(HISTORY_DATA_ROOT, data_path)
+    history = PositionHistory(path=data_path, store_path=tmp_path / "store")
+
+    assert isinstance(history.read().Ticker.dtype, pd.CategoricalDtype)
+
+    monkeypatch.setattr(PositionHistory, "_dtypes", {**history.dtypes, "Ticker": "object"})
+    assert not isinstance(history.read().Ticker.dtype, pd.CategoricalDtype)
+
+    monkeypatch.setattr("sp.cache.CACHE_VERSION", "test")
+    assert len(history.read()) == len(PositionHistory(path=data_path).read())
+    assert len(list((tmp_path / "store").glob("*.parquet"))) == len(list(data_path.iterdir()))
@@ -1,9 +1,16 @@
+import json
 import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import List
 
+import pytest
 from click.testing import CliRunner
 
-from sp._testing.env import HISTORY_DATA_ROOT, TEST_DATA_ROOT
-from sp.cli import cli
+from sp._testing.env import HISTORY_DATA_ROOT, REPO_ROOT, TEST_DATA_ROOT
+from sp.cli import BACKENDS, cli
+from sp.executor import BACKENDS as EXECUTOR_BACKENDS
 
 
 def test_cli_write_doh_div_xml() -> None:
@@ -33,3 +40,142 @@ def test_cli_write_doh_div_xml() -> None:
     assert result.exit_code == 0
 
     shutil.rmtree(output_path)
+
+
+def test_cli_write_doh_div_xml_with_cache(tmp_path: Path) -> None:
+
+    config_path = TEST_DATA_ROOT / "test_xml_writer" / "test_write" / "test_config.json"
+    cache_path = tmp_path / "cache"
+
+    runner = CliRunner()
+    for _ in range(2):
+        result = runner.invoke(
+            cli,
+            [
+                "div-doh",
+                "xml-report",
+                "--taxpayer-info",
+                str(config_path),
+                "--data-path",
+                str(HISTORY_DATA_ROOT),
+                "--xml-path",
+                str(tmp_path / "output.xml"),
+                "--cache-path",
+                str(cache_path),
+            ],
+        )
+        assert result.exit_code == 0
+
+    assert len(list(cache_path.glob("*.parquet"))) == 3
+
+
+def test_cli_write_doh_div_xml_batch(tmp_path: Path) -> None:
+
+    config_path = TEST_DATA_ROOT / "test_xml_writer" / "test_write" / "test_config.json"
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(
+        json.dumps(
+            {
+                "jobs": [
+                    {"taxpayer_info": str(config_path), "data_path": str(HISTORY_DATA_ROOT), "xml_path": "output.xml"},
+                    {"taxpayer_info": str(config_path), "data_path": "missing", "xml_path": "missing.xml"},
+                ]
+            }
+        )
+    )
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["div-doh", "xml-batch", "--manifest", str(manifest_path), "--n-workers", "2"])
+
+    assert result.exit_code == 1
+    assert "1 of 2 reports written." in result.output
+    assert (tmp_path / "output.xml").exists()
+
+
+@pytest.mark.parametrize("profile", ["text", "json"])
+def test_cli_write_doh_div_xml_with_profile(tmp_path: Path, profile: str) -> None:
+
+    config_path = TEST_DATA_ROOT / "test_xml_writer" / "test_write" / "test_config.json"
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "div-doh",
+            "xml-report",
+            "--taxpayer-info",
+            str(config_path),
+            "--data-path",
+            str(HISTORY_DATA_ROOT),
+            "--xml-path",
+            str(tmp_path / "output.xml"),
+            "--profile",
+            profile,
+        ],
+    )
+    assert result.exit_code == 0
+
+    if profile == "json":
+        stages = json.loads(result.output)["stages"]
+        assert {"history.read", "report.ticker", "xml.load", "xml.write"} <= set(stages)
+        assert stages["xml.load"]["rows"] == 20
+    else:
+        assert result.output.splitlines()[0].split()[:2] == ["stage", "calls"]
+
+
+def test_cli_write_doh_div_xml_pipelined(tmp_path: Path) -> None:
+    base_path = TEST_DATA_ROOT / "test_xml_writer" / "test_write"
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "div-doh",
+            "xml-report",
+            "--taxpayer-info",
+            str(base_path / "test_config.json"),
+            "--data-path",
+            str(HISTORY_DATA_ROOT),
+            "--xml-path",
+            str(tmp_path / "output.xml"),
+            "--pipeline",
+            "--profile",
+            "json",
+        ],
+    )
+    assert result.exit_code == 0
+
+    assert (tmp_path / "output.xml").read_bytes() == (base_path / "compare.xml").read_bytes()
+    assert {"history.read", "report.ticker", "xml.write"} <= set(json.loads(result.output)["stages"])
+
+
+@pytest.mark.parametrize(
+    "args,exit_code",
+    [
+        (["--help"], 0),
+        (["div-doh", "xml-report", "--help"], 0),
+        (["div-doh", "xml-report"], 2),
+        (["div-doh", "xml-report", "--taxpayer-info", "missing.json", "--data-path", ".", "--xml-path", "x.xml"], 2),
+        (["div-doh", "xml-batch", "--manifest", "missing.json"], 2),
+        (["div-doh", "xml-batch", "--manifest", "pyproject.toml", "--backend", "gpu"], 2),
+    ],
+)
+def test_cli_help_and_validation_skip_heavy_imports(args: List[str], exit_code: int) -> None:
+    # A fresh interpreter, the test session has imported everything already.
+    check = (
+        "import sys\n"
+        "from sp.cli import cli\n"
+        "try:\n"
+        f"    cli({args!r})\n"
+        "except SystemExit as error:\n"
+        "    code = error.code\n"
+        "heavy = [name for name in ('pandas', 'pydantic', 'numpy', 'concurrent.futures') if name in sys.modules]\n"
+        "print(code, heavy, file=sys.stderr)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", check], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+
+    assert result.stderr.splitlines()[-1] == f"{exit_code} []"
+
+
+def test_cli_backends_match_executor() -> None:
+    assert BACKENDS == list(EXECUTOR_BACKENDS)
@@ -1,5 +1,8 @@
+import asyncio
 from pathlib import Path
+from typing import List
 
+import pandas as pd
 import pytest
 
 from sp._testing.env import HISTORY_DATA_ROOT
@@ -45,3 +48,48 @@ def test_create_report_for_all(input_path: Path) -> None:
 
     assert abs(full_report.query("TICKER == 'VECP'")["TOTAL"].sum() - 15.12) < 0.001
     assert set(full_report.TICKER.unique()) == {"VECP", "VGTY", "CORP"}
+
+
+@pytest.mark.parametrize("input_path", [HISTORY_DATA_ROOT])
+def test_partitioned_report_matches_per_ticker_report(input_path: Path) -> None:
+    reports = [
+        DividendReport(
+            years=[2021, 2022],
+            history=DividendHistory(path=input_path),
+            partition_history=partition_history,
+        ).create_report()
+        for partition_history in [True, False]
+    ]
+
+    pd.testing.assert_frame_equal(*reports)
+
+
+async def collect_batches(div_report: DividendReport, batch_size: int) -> List[pd.DataFrame]:
+    return [batch async for batch in div_report.aiter_batches(batch_size=batch_size, queue_size=2)]
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 10_000])
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_batches_match_report(batch_size: int, pipelined: bool) -> None:
+    div_report = DividendReport(
+        years=[2021, 2022],
+        history=DividendHistory(path=HISTORY_DATA_ROOT),
+    )
+
+    report = div_report.create_report()
+    if pipelined:
+        batches = asyncio.run(collect_batches(div_report, batch_size))
+    else:
+        batches = list(div_report.iter_batches(batch_size=batch_size))
+
+    assert all(len(batch) == batch_size for batch in batches[:-1])
+    assert 0 < len(batches[-1]) <= batch_size
+    pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), report)
+
+
+def test_report_keeps_the_dtypes_of_the_export() -> None:
+    report = DividendReport(years=[2022], history=DividendHistory(path=HISTORY_DATA_ROOT)).create_report()
+    export = pd.read_csv(HISTORY_DATA_ROOT / "test_2022.csv")
+
+    for column, export_column in [("TICKER", "Ticker"), ("NAME", "Name"), ("ISIN", "ISIN")]:
+        assert report[column].dtype == export[export_column].dtype
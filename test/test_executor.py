@@ -0,0 +1,143 @@
+import asyncio
+import os
+import threading
+import time
+from typing import AsyncIterator, List
+
+import pandas as pd
+import pytest
+
+from sp._testing.env import HISTORY_DATA_ROOT
+from sp.executor import MAX_CHUNKSIZE, ReportExecutor
+from sp.history import DividendHistory
+from sp.report import DividendReport
+
+
+@pytest.fixture(autouse=True)
+def eight_cores(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+
+
+def square(value: int) -> int:
+    return value * value
+
+
+async def collect(results: AsyncIterator[int]) -> List[int]:
+    return [result async for result in results]
+
+
+@pytest.mark.parametrize("backend", ["process", "thread", "serial", "auto"])
+def test_amap_keeps_order(backend: str) -> None:
+    with ReportExecutor(backend=backend, n_workers=2, chunksize=3) as executor:
+        results = asyncio.run(collect(executor.amap(square, range(20), queue_size=2)))
+
+    assert results == [value * value for value in range(20)]
+
+
+def test_amap_applies_backpressure() -> None:
+    started: List[int] = []
+    lock = threading.Lock()
+
+    def track(value: int) -> int:
+        with lock:
+            started.append(value)
+        return value
+
+    async def consume(executor: ReportExecutor) -> List[int]:
+        consumed = []
+        async for value in executor.amap(track, range(10), queue_size=2):
+            await asyncio.sleep(0.05)
+            with lock:
+                # Tasks beyond the two unconsumed slots wait for the slow consumer.
+                assert len(started) <= value + 3
+            consumed.append(value)
+
+        return consumed
+
+    with ReportExecutor(backend="thread", n_workers=2) as executor:
+        assert asyncio.run(consume(executor)) == list(range(10))
+
+
+def fail_on_three(value: int) -> int:
+    if value == 3:
+        raise ValueError("three")
+    time.sleep(0.01)
+    return value
+
+
+def test_amap_raises_task_errors() -> None:
+    with ReportExecutor(backend="thread", n_workers=2) as executor, pytest.raises(ValueError, match="three"):
+        asyncio.run(collect(executor.amap(fail_on_three, range(10), queue_size=2)))
+
+
+@pytest.mark.parametrize("backend", ["process", "thread", "serial", "auto"])
+def test_map_keeps_order(backend: str) -> None:
+    with ReportExecutor(backend=backend, n_workers=2, chunksize=3) as executor:
+        assert list(executor.map(square, range(20))) == [value * value for value in range(20)]
+
+
+def test_map_applies_backpressure() -> None:
+    started: List[int] = []
+    lock = threading.Lock()
+
+    def track(value: int) -> int:
+        with lock:
+            started.append(value)
+        return value
+
+    with ReportExecutor(backend="thread", n_workers=2) as executor:
+        results = executor.map(track, range(20))
+        for value in results:
+            time.sleep(0.02)
+            with lock:
+                # Two tasks per worker run ahead of the slow consumer at most.
+                assert len(started) <= value + 5
+            if value == 10:
+                break
+
+        results.close()  # type: ignore[attr-defined]
+
+    assert len(started) <= 15
+
+
+def test_pool_is_reused() -> None:
+    with ReportExecutor(backend="thread", n_workers=2) as executor:
+        _ = list(executor.map(square, range(4)))
+        pool = executor.pool("thread")
+        _ = list(executor.map(square, range(4)))
+
+        assert executor.pool("thread") is pool
+
+
+@pytest.mark.parametrize(
+    "n_tasks,n_rows,expected",
+    [(1, 10**6, "serial"), (50, 100, "serial"), (50, 10**6, "process"), (50, None, "process")],
+)
+def test_auto_backend(n_tasks: int, n_rows: int, expected: str) -> None:
+    assert ReportExecutor(n_workers=2).resolve_backend(n_tasks=n_tasks, n_rows=n_rows) == expected
+    assert ReportExecutor(n_workers=1).resolve_backend(n_tasks=n_tasks, n_rows=n_rows) == "serial"
+
+
+def test_task_chunksize() -> None:
+    assert ReportExecutor(n_workers=2).task_chunksize(100) == 13
+    assert ReportExecutor(n_workers=2, chunksize=7).task_chunksize(100) == 7
+    assert ReportExecutor(n_workers=2).task_chunksize(3) == 1
+    assert ReportExecutor().task_chunksize(100) == 4
+    assert ReportExecutor(n_workers=2).task_chunksize(100_000) == MAX_CHUNKSIZE
+
+
+def test_unsupported_backend() -> None:
+    with pytest.raises(ValueError):
+        _ = ReportExecutor(backend="cluster")
+
+
+def test_shared_executor_across_reports() -> None:
+    reports = []
+
+    with ReportExecutor(backend="process", n_workers=2) as executor:
+        for years in [[2021], [2022]]:
+            report = DividendReport(years=years, history=DividendHistory(path=HISTORY_DATA_ROOT))
+            reports.append(report.create_report(executor=executor))
+
+    expected = DividendReport(years=[2022], history=DividendHistory(path=HISTORY_DATA_ROOT), backend="serial")
+    pd.testing.assert_frame_equal(reports[1], expected.create_report())
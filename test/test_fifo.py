@@ -0,0 +1,117 @@
+from typing import List, Tuple
+
+import numpy as np
+import pytest
+
+from sp._testing.env import PRECISION_GUARD
+from sp.fifo import match_fifo, open_lots
+
+
+def reference_fifo(buy_shares: List[float], sell_shares: List[float]) -> List[Tuple[float, int, int]]:
+    """Lot-by-lot FIFO pairing the vectorized engine has to reproduce."""
+    pairs = []
+    buy_index, buy_left = 0, buy_shares[0]
+
+    for sell_index, sell_left in enumerate(sell_shares):
+        while sell_left >= PRECISION_GUARD:
+            shares = min(buy_left, sell_left)
+            pairs.append((shares, buy_index, sell_index))
+            buy_left -= shares
+            sell_left -= shares
+
+            if buy_left < PRECISION_GUARD and buy_index + 1 < len(buy_shares):
+                buy_index += 1
+                buy_left = buy_shares[buy_index]
+
+    return pairs
+
+
+def test_match_fifo_splits_lots() -> None:
+    num_shares, buy_index, sell_index = match_fifo(np.array([2.0, 3.0, 1.0]), np.array([1.0, 3.0, 1.5]))
+
+    assert num_shares.tolist() == [1.0, 1.0, 2.0, 1.0, 0.5]
+    assert buy_index.tolist() == [0, 0, 1, 1, 2]
+    assert sell_index.tolist() == [0, 1, 1, 2, 2]
+
+
+def test_match_fifo_without_sells() -> None:
+    num_shares, buy_index, sell_index = match_fifo(np.array([2.0]), np.array([]))
+
+    assert num_shares.size == buy_index.size == sell_index.size == 0
+
+
+def test_match_fifo_raises_on_oversold_position() -> None:
+    with pytest.raises(ValueError):
+        _ = match_fifo(np.array([1.0]), np.array([0.5, 0.6]))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_match_fifo_matches_reference(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    buy_shares = rng.uniform(0.01, 10.0, size=500).round(7)
+    sell_shares = rng.uniform(0.01, 10.0, size=400).round(7)
+    sell_shares *= 0.9 * buy_shares.sum() / sell_shares.sum()
+
+    num_shares, buy_index, sell_index = match_fifo(buy_shares, sell_shares)
+    expected_shares, expected_buy_index, expected_sell_index = zip(
+        *reference_fifo(buy_shares.tolist(), sell_shares.tolist())
+    )
+
+    assert buy_index.tolist() == list(expected_buy_index)
+    assert sell_index.tolist() == list(expected_sell_index)
+    np.testing.assert_allclose(num_shares, expected_shares, atol=1e-7)
+
+
+def test_match_fifo_with_large_share_totals() -> None:
+    rng = np.random.default_rng(0)
+    buy_shares = rng.uniform(500.0, 1500.0, size=20_000).round(7)
+    # Every buy but the last one is sold in two parts, so sell and buy bounds coincide.
+    first_parts = (buy_shares[:-1] * rng.uniform(0.2, 0.8, size=buy_shares.size - 1)).round(7)
+    sell_shares = np.column_stack([first_parts, (buy_shares[:-1] - first_parts).round(7)]).ravel()
+
+    num_shares, buy_index, sell_index = match_fifo(buy_shares, sell_shares)
+    expected_shares, expected_buy_index, expected_sell_index = zip(
+        *reference_fifo(buy_shares.tolist(), sell_shares.tolist())
+    )
+
+    assert buy_shares.sum() > 1e7
+    assert buy_index.tolist() == list(expected_buy_index)
+    assert sell_index.tolist() == list(expected_sell_index)
+    np.testing.assert_allclose(num_shares, expected_shares, atol=1e-7)
+
+    remaining, lot_index = open_lots(buy_shares, sell_shares)
+    assert remaining.tolist() == [buy_shares[-1]]
+    assert lot_index.tolist() == [buy_shares.size - 1]
+
+
+def test_open_lots_keeps_unsold_shares() -> None:
+    remaining, lot_index = open_lots(np.array([2.0, 3.0, 1.0]), np.array([1.0, 3.0]))
+
+    assert remaining.tolist() == [1.0, 1.0]
+    assert lot_index.tolist() == [1, 2]
+
+
+def test_open_lots_of_closed_position() -> None:
+    remaining, lot_index = open_lots(np.array([2.0, 3.0]), np.array([1.0, 4.0 - PRECISION_GUARD / 10]))
+
+    assert remaining.size == lot_index.size == 0
+    assert open_lots(np.array([]), np.array([]))[0].size == 0
+
+    with pytest.raises(ValueError):
+        _ = open_lots(np.array([1.0]), np.array([1.5]))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_open_lots_complement_matched_shares(seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    buy_shares = rng.uniform(0.01, 10.0, size=300).round(7)
+    sell_shares = rng.uniform(0.01, 10.0, size=200).round(7)
+    sell_shares *= 0.7 * buy_shares.sum() / sell_shares.sum()
+
+    num_shares, buy_index, _ = match_fifo(buy_shares, sell_shares)
+    remaining, lot_index = open_lots(buy_shares, sell_shares)
+
+    matched = np.bincount(buy_index, weights=num_shares, minlength=buy_shares.size)
+    assert np.allclose(matched[lot_index] + remaining, buy_shares[lot_index])
+    assert np.allclose(np.delete(matched, lot_index), np.delete(buy_shares, lot_index))
+    assert (np.diff(lot_index) == 1).all()
@@ -1,3 +1,4 @@
+import pandas as pd
 import pytest
 
 from sp._testing.env import HISTORY_DATA_ROOT, PRECISION_GUARD
@@ -26,3 +27,16 @@ def test_fifo_report_single_ticker(ticker: str) -> None:
         input_history_df.query("Action == 'Market sell'")["No. of shares"].sum() - report_df["NUM_SHARES"].sum()
         < PRECISION_GUARD
     )
+
+
+def test_partitioned_report_matches_per_ticker_report() -> None:
+    reports = [
+        FifoPositionReport(
+            years=[2020, 2021, 2022],
+            history=PositionHistory(path=HISTORY_DATA_ROOT),
+            partition_history=partition_history,
+        ).create_report()
+        for partition_history in [True, False]
+    ]
+
+    pd.testing.assert_frame_equal(*reports)
@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sp._testing.env import CONVERSION_DATA_ROOT, HISTORY_DATA_ROOT
+from sp.fx import RateTable, load_rate_table
+from sp.history import DividendHistory, PositionHistory
+from sp.report import FifoPositionReport
+
+
+@pytest.fixture
+def rate_table() -> RateTable:
+    return RateTable.at(CONVERSION_DATA_ROOT)
+
+
+def test_rates_at(rate_table: RateTable) -> None:
+    # 2022-09-24 is a saturday, it gets the rate of the friday before.
+    currencies = pd.Series(["EUR", "USD", "GBP", "GBX", None, "USD"])
+    times = pd.Series(
+        pd.to_datetime(["2022-09-23", "2022-09-23", "2022-09-23", "2022-09-23", "2022-09-23", "2022-09-24"])
+    )
+    usd, gbp = rate_table.rates[list(rate_table.dates).index(np.datetime64("2022-09-23"))]
+
+    rates = rate_table.rates_at(currencies, times)
+
+    np.testing.assert_array_equal(rates, [1.0, usd, gbp, 100 * gbp, np.nan, usd])
+
+
+def test_rates_at_missing(rate_table: RateTable) -> None:
+    with pytest.raises(ValueError):
+        rate_table.rates_at(pd.Series(["CHF"]), pd.Series(pd.to_datetime(["2022-09-23"])))
+
+    with pytest.raises(ValueError):
+        rate_table.rates_at(pd.Series(["USD"]), pd.Series(pd.to_datetime(["2019-01-01"])))
+
+
+def test_rate_table_is_memoized(rate_table: RateTable) -> None:
+    assert RateTable.at(CONVERSION_DATA_ROOT) is rate_table
+
+
+def test_rate_table_cache(rate_table: RateTable, tmp_path: Path) -> None:
+    compiled = RateTable.at(CONVERSION_DATA_ROOT, cache_path=tmp_path)
+    load_rate_table.cache_clear()
+    mapped = RateTable.at(CONVERSION_DATA_ROOT, cache_path=tmp_path)
+
+    assert isinstance(mapped.rates, np.memmap) and not isinstance(compiled.rates, np.memmap)
+    assert mapped.currencies == rate_table.currencies
+    np.testing.assert_array_equal(mapped.dates, rate_table.dates)
+    np.testing.assert_array_equal(mapped.rates, rate_table.rates)
+
+
+def test_history_rates() -> None:
+    history = PositionHistory(path=HISTORY_DATA_ROOT).read()
+    converted = PositionHistory(path=HISTORY_DATA_ROOT, rates_path=CONVERSION_DATA_ROOT).read()
+
+    pd.testing.assert_frame_equal(converted.drop(columns="Exchange rate"), history.drop(columns="Exchange rate"))
+    # The test rates are daily medians of the broker's rates.
+    np.testing.assert_allclose(converted["Exchange rate"], history["Exchange rate"], rtol=0.02)
+
+
+def test_history_rates_without_currency() -> None:
+    with pytest.raises(ValueError):
+        DividendHistory(path=HISTORY_DATA_ROOT, rates_path=CONVERSION_DATA_ROOT).read()
+
+
+def test_fifo_report_rates() -> None:
+    years = [2020, 2021, 2022]
+    report = FifoPositionReport(years=years, history=PositionHistory(path=HISTORY_DATA_ROOT)).create_report()
+    converted = FifoPositionReport(
+        years=years, history=PositionHistory(path=HISTORY_DATA_ROOT, rates_path=CONVERSION_DATA_ROOT)
+    ).create_report()
+
+    pd.testing.assert_frame_equal(
+        converted.drop(columns=["BUY_PRICE_PER_SHARE", "SELL_PRICE_PER_SHARE", "RESULT"]),
+        report.drop(columns=["BUY_PRICE_PER_SHARE", "SELL_PRICE_PER_SHARE", "RESULT"]),
+    )
+    np.testing.assert_allclose(converted.SELL_PRICE_PER_SHARE, report.SELL_PRICE_PER_SHARE, rtol=0.02)
@@ -1,7 +1,12 @@
 from pathlib import Path
+from typing import Optional, Type
+
+import pandas as pd
+import pytest
 
 from sp._testing.env import HISTORY_DATA_ROOT
 from sp.history import DividendHistory, PositionHistory
+from sp.model import HistoryModel
 
 
 def test_dividend_history() -> None:
@@ -42,3 +47,43 @@ def test_position_history() -> None:
         ]
     )
     assert set(trans_history.actions) == set(["Market buy", "Market sell"])
+
+
+@pytest.mark.parametrize("history_class", [DividendHistory, PositionHistory])
+def test_typed_schema(history_class: Type[HistoryModel]) -> None:
+    history = history_class(path=HISTORY_DATA_ROOT).read()
+
+    for column in ["Action", "Ticker", "ISIN", "Name"]:
+        assert isinstance(history[column].dtype, pd.CategoricalDtype)
+    for column in ["No. of shares", "Price / share", "Total (EUR)", "Exchange rate"]:
+        assert history[column].dtype == "float64"
+
+
+@pytest.mark.parametrize("history_class", [DividendHistory, PositionHistory])
+@pytest.mark.parametrize("n_workers,engine", [(3, None), (1, "pyarrow"), (3, "pyarrow")])
+def test_parallel_read_matches_serial_read(
+    history_class: Type[HistoryModel], n_workers: int, engine: Optional[str]
+) -> None:
+    history = history_class(path=HISTORY_DATA_ROOT).read()
+    parallel_history = history_class(path=HISTORY_DATA_ROOT, n_workers=n_workers, engine=engine).read()
+
+    pd.testing.assert_frame_equal(history, parallel_history, check_like=True)
+
+
+def test_unsupported_engine() -> None:
+    with pytest.raises(ValueError):
+        _ = DividendHistory(path=HISTORY_DATA_ROOT, engine="polars")
+
+
+@pytest.mark.parametrize("query", [None, "Ticker == 'VECP'", "YEAR == 2021"])
+@pytest.mark.parametrize("chunksize", [50, 10_000])
+def test_chunked_read_matches_full_read(query: Optional[str], chunksize: int) -> None:
+    history = PositionHistory(path=HISTORY_DATA_ROOT, query=query).read()
+    chunked_history = PositionHistory(path=HISTORY_DATA_ROOT, query=query, chunksize=chunksize).read()
+
+    pd.testing.assert_frame_equal(history, chunked_history, check_categorical=False)
+
+
+def test_chunked_read_with_pyarrow_engine() -> None:
+    with pytest.raises(ValueError):
+        _ = PositionHistory(path=HISTORY_DATA_ROOT, engine="pyarrow", chunksize=100)
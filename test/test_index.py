@@ -0,0 +1,83 @@
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from sp._testing.env import HISTORY_DATA_ROOT
+from sp.history import DividendHistory, PositionHistory
+from sp.index import HistoryIndex
+from sp.report import DividendReport, FifoPositionReport
+
+
+@pytest.fixture(scope="module")
+def history() -> pd.DataFrame:
+    return PositionHistory(path=HISTORY_DATA_ROOT).read()
+
+
+def test_ticker_slices_match_query(history: pd.DataFrame) -> None:
+    history_index = PositionHistory(path=HISTORY_DATA_ROOT).read_index()
+
+    assert set(history_index.tickers) == set(history.Ticker.unique())
+    assert set(history_index.isins) == set(history.ISIN.unique())
+
+    for ticker in ["VECP", "GME", "LGGL"]:
+        pd.testing.assert_frame_equal(
+            history_index.ticker(ticker), history.query(f"Ticker == '{ticker}'").reset_index(drop=True)
+        )
+
+    isin = history.ISIN.iloc[0]
+    pd.testing.assert_frame_equal(history_index.isin(isin), history.query(f"ISIN == '{isin}'").reset_index(drop=True))
+
+
+def test_unknown_instrument_is_empty(history: pd.DataFrame) -> None:
+    history_index = HistoryIndex.build(history)
+
+    assert history_index.ticker("UNKNOWN").empty
+    assert list(history_index.isin("UNKNOWN").columns) == list(history.columns)
+
+
+def test_ticker_under_several_isins() -> None:
+    history = pd.DataFrame(
+        {
+            "Ticker": ["A", "B", "A", None, "A"],
+            "ISIN": ["X2", "X1", "X1", "X3", "X2"],
+            "Time": [0, 1, 2, 3, 4],
+        }
+    )
+    history_index = HistoryIndex.build(history)
+
+    assert history_index.ticker("A").Time.tolist() == [0, 2, 4]
+    assert history_index.isin("X1").Time.tolist() == [2, 1]
+    assert history_index.isin("X3").Time.tolist() == [3]
+    assert set(history_index.tickers) == {"A", "B"}
+
+
+def test_partitioned_report_of_ticker_under_several_isins(tmp_path: Path) -> None:
+    shutil.copytree(HISTORY_DATA_ROOT, tmp_path, dirs_exist_ok=True)
+    export = pd.read_csv(tmp_path / "test_2022.csv", dtype=str, keep_default_na=False)
+    isin = export.ISIN[export.Ticker == "VECP"].iloc[0]
+    export.loc[export.index[export.Ticker == "VECP"][::2], "ISIN"] = "IE00RELISTED"
+    export.to_csv(tmp_path / "test_2022.csv", index=False)
+
+    reports = [
+        DividendReport(
+            years=[2022],
+            history=DividendHistory(path=tmp_path),
+            partition_history=partition_history,
+            share_history=share_history,
+        ).create_report()
+        for partition_history, share_history in [(False, False), (True, False), (True, True)]
+    ]
+
+    assert set(reports[0].query("TICKER == 'VECP'").ISIN) == {"IE00RELISTED", isin}
+    for report in reports[1:]:
+        pd.testing.assert_frame_equal(report, reports[0])
+
+
+def test_ticker_query_is_combined_with_history_query() -> None:
+    report = FifoPositionReport(history=PositionHistory(path=HISTORY_DATA_ROOT, query="YEAR == 2021 or YEAR == 2022"))
+    ticker_history = report.add_ticker_to_history_query("GME")
+
+    assert ticker_history.query == "Ticker == 'GME' and (YEAR == 2021 or YEAR == 2022)"
+    assert set(ticker_history.read().YEAR) <= {2021, 2022}
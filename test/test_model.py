@@ -45,9 +45,11 @@ def test_read(input_path: Path) -> None:
 
     data = HistoryModel(path=input_path, _columns=read_columns, _actions=read_actions).read()
 
-    assert set(data.columns) == read_columns | {"Action"}
+    assert set(data.columns) == read_columns | {"Action", "DATE", "YEAR", "TAX_YEAR"}
     assert set(data["Action"].values) == read_actions
     assert set(data.Time.astype("datetime64[ns]").apply(lambda x: x.year).values) == {2020, 2021, 2022}
+    assert (data.YEAR == data.Time.dt.year).all()
+    assert (data.DATE == data.Time.dt.date.astype(str)).all()
 
 
 @pytest.mark.parametrize("input_path", [(HISTORY_DATA_ROOT / "fake_test_2020.csv")])
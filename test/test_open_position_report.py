@@ -0,0 +1,75 @@
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+import pytest
+
+from sp._testing.env import HISTORY_DATA_ROOT, PRECISION_GUARD
+from sp._testing.synthetic import SyntheticExport
+from sp.history import PositionHistory
+from sp.report import FifoPositionReport, OpenPositionReport
+
+
+def net_shares(history: pd.DataFrame) -> pd.Series:
+    signed = history["No. of shares"].where(history.Action == "Market buy", -history["No. of shares"])
+
+    return signed.groupby(history.Ticker.astype(str)).sum()
+
+
+@pytest.mark.parametrize("years", [[2021], [2020, 2022]])
+def test_open_lots_hold_unsold_shares(years: List[int]) -> None:
+    report = OpenPositionReport(years=years, history=PositionHistory(path=HISTORY_DATA_ROOT)).create_report()
+
+    history = PositionHistory(path=HISTORY_DATA_ROOT).read()
+    expected = net_shares(history[history.YEAR <= max(years)])
+    expected = expected[expected >= PRECISION_GUARD]
+
+    open_shares = report.groupby("TICKER").NUM_SHARES.sum()
+    pd.testing.assert_series_equal(open_shares.sort_index(), expected.sort_index(), check_names=False)
+    assert (report.NUM_SHARES > 0).all()
+    assert ((report.COST_BASIS - report.NUM_SHARES * report.BUY_PRICE_PER_SHARE).abs() < PRECISION_GUARD).all()
+
+
+def test_open_lots_complement_closed_lots() -> None:
+    history = PositionHistory(path=HISTORY_DATA_ROOT, query="Ticker == 'GME'")
+    closed = FifoPositionReport(years=[2021], history=history).create_report()
+    opened = OpenPositionReport(years=[2021], history=history).create_report()
+
+    bought = history.read().query("Action == 'Market buy'")["No. of shares"].sum()
+    assert abs(closed.NUM_SHARES.sum() + opened.NUM_SHARES.sum() - bought) < PRECISION_GUARD
+
+
+def test_open_lots_are_valued_at_price_table(tmp_path: Path) -> None:
+    price_path = tmp_path / "prices.csv"
+    pd.DataFrame({"TICKER": ["XD9U", "LGGL"], "PRICE": [100.0, 20.0]}).to_csv(price_path, index=False)
+
+    report = OpenPositionReport(
+        years=[2022], history=PositionHistory(path=HISTORY_DATA_ROOT), price_path=price_path
+    ).create_report()
+
+    priced = report[report.TICKER.isin(["XD9U", "LGGL"])]
+    assert not priced.empty
+    assert (priced.MARKET_VALUE == priced.NUM_SHARES * priced.PRICE).all()
+    assert (priced.UNREALIZED_RESULT == priced.MARKET_VALUE - priced.COST_BASIS).all()
+    assert report[~report.TICKER.isin(["XD9U", "LGGL"])].MARKET_VALUE.isna().all()
+
+
+def test_price_table_needs_price_and_key(tmp_path: Path) -> None:
+    price_path = tmp_path / "prices.csv"
+    pd.DataFrame({"NAME": ["X"], "PRICE": [1.0]}).to_csv(price_path, index=False)
+
+    report = OpenPositionReport(years=[2022], history=PositionHistory(path=HISTORY_DATA_ROOT), price_path=price_path)
+    with pytest.raises(ValueError):
+        _ = report.create_report()
+
+
+def test_open_lots_from_snapshots_match_full_replay(tmp_path: Path) -> None:
+    SyntheticExport(n_tickers=6, fills_per_ticker=100, years=[2020, 2021, 2022]).write(tmp_path / "data")
+    history = PositionHistory(path=tmp_path / "data")
+
+    reports = [
+        OpenPositionReport(years=[2022], history=history, snapshot_path=snapshot_path).create_report()
+        for snapshot_path in [None, tmp_path / "snapshots"]
+    ]
+
+    pd.testing.assert_frame_equal(*reports, check_exact=False)
@@ -0,0 +1,50 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from sp._testing.env import HISTORY_DATA_ROOT
+from sp.history import DividendHistory
+from sp.payers import PAYER_COLUMNS, PayerRegistry
+from sp.report import DividendReport
+
+VANGUARD = ("Europadamm 2-6, 41460 Neuss, Germany", "Germany", "192/2006, 10. člen")
+ISHARES = ("2 Ballsbridge Park, Ballsbridge, Dublin, D04 YW83", "Ireland", "96/2002, 10. člen")
+
+
+def test_registry_resolves_isins_and_issuers() -> None:
+    registry = PayerRegistry.at()
+
+    assert registry.resolve("IE00BZ163G84", "Vanguard EUR Corporate Bond (Dist)") == VANGUARD
+    # Unlisted funds fall back to their issuer.
+    assert registry.resolve("DE0002635307", "iShares STOXX Europe 600 DE (Dist)") == ISHARES
+
+    with pytest.raises(ValueError):
+        registry.resolve("US1912161007", "Coca-Cola")
+
+
+def test_registry_is_shared() -> None:
+    assert PayerRegistry.at() is PayerRegistry.at()
+
+
+def test_join(tmp_path: Path) -> None:
+    registry_path = tmp_path / "payers.csv"
+    pd.DataFrame(
+        {
+            "ISIN": ["US1912161007", ""],
+            "ISSUER": ["Coca-Cola", "Vanguard"],
+            "PAYER_ADDRESS": ["Atlanta", "Neuss"],
+            "PAYER_COUNTRY": ["United States", "Germany"],
+            "RELIEF_STATEMENT": ["US", "DE"],
+        }
+    ).to_csv(registry_path, index=False)
+
+    report = DividendReport(years=[2020, 2021, 2022], history=DividendHistory(path=HISTORY_DATA_ROOT)).create_report()
+    report = report[report.NAME.str.contains("Coca-Cola|Vanguard").to_numpy()].reset_index(drop=True)
+
+    joined = PayerRegistry.at(registry_path).join(report)
+
+    pd.testing.assert_frame_equal(joined.drop(columns=PAYER_COLUMNS), report)
+    is_coca_cola = report.ISIN == "US1912161007"
+    assert (joined.PAYER_COUNTRY == is_coca_cola.map({True: "United States", False: "Germany"})).all()
+    assert set(joined.RELIEF_STATEMENT[~is_coca_cola]) == {"DE"}
@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pytest
+
+from sp._testing.env import HISTORY_DATA_ROOT
+from sp.history import PositionHistory
+from sp.profile import (
+    PROC_CLEAR_REFS_PATH,
+    active_profile,
+    profiled_iter,
+    profiling,
+    stage,
+)
+from sp.report import FifoPositionReport
+
+
+def test_stages_are_recorded_only_while_profiling() -> None:
+    with stage("outside") as stats:
+        stats.rows = 3
+
+    with profiling() as profile:
+        for rows in [2, 5]:
+            with stage("inside") as stats:
+                stats.rows = rows
+
+        assert list(profiled_iter("items", [[1, 2], [3]])) == [[1, 2], [3]]
+
+    assert active_profile() is None
+    assert set(profile.stages) == {"inside", "items"}
+    assert profile.stages["inside"].calls == 2
+    assert profile.stages["inside"].rows == 7
+    assert profile.stages["items"].calls == 1
+    assert profile.stages["items"].rows == 3
+    assert profile.stages["inside"].peak_rss_mb > 0
+
+
+@pytest.mark.skipif(not os.access(PROC_CLEAR_REFS_PATH, os.W_OK), reason="The peak memory can't be reset.")
+def test_peak_memory_is_per_stage() -> None:
+    with profiling() as profile:
+        with stage("outer"):
+            with stage("large"):
+                large = np.ones(25_000_000)
+                del large
+
+            with stage("tiny"):
+                pass
+
+    stages = profile.stages
+    assert stages["tiny"].peak_rss_mb < stages["large"].peak_rss_mb - 150
+    assert stages["outer"].peak_rss_mb >= stages["large"].peak_rss_mb
+
+
+@pytest.mark.parametrize("backend", ["process", "thread", "serial"])
+def test_worker_stages_are_merged(monkeypatch: pytest.MonkeyPatch, backend: str) -> None:
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+    report = FifoPositionReport(
+        years=[2021, 2022], history=PositionHistory(path=HISTORY_DATA_ROOT), backend=backend, n_workers=2
+    )
+
+    with profiling() as profile:
+        result = report.create_report()
+
+    ticker_stats = profile.stages["report.ticker"]
+    assert profile.stages["report.create"].rows == len(result)
+    assert profile.stages["history.read"].calls == 1
+    assert 0 < ticker_stats.rows <= profile.stages["history.read"].rows
+
+    if backend == "serial":
+        assert not profile.workers
+    else:
+        assert sum(stages["report.ticker"].calls for stages in profile.workers.values()) == ticker_stats.calls
+        assert all(worker.startswith(str(os.getpid())) == (backend == "thread") for worker in profile.workers)
+
+
+def test_profile_serializes_to_json() -> None:
+    with profiling() as profile:
+        PositionHistory(path=HISTORY_DATA_ROOT).read()
+
+    assert '"history.read"' in profile.to_json()
+    assert "history.read" in profile.summary()
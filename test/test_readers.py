@@ -0,0 +1,134 @@
+from pathlib import Path
+from typing import Iterator, Optional
+
+import pandas as pd
+import pytest
+from pydantic import ValidationError
+
+from sp._testing.env import HISTORY_DATA_ROOT
+from sp.history import DividendHistory, PositionHistory
+from sp.readers import (
+    FORMATS,
+    BrokerFormat,
+    compile_reader,
+    detect_format,
+    register_format,
+)
+from sp.report import DividendReport, FifoPositionReport
+from sp.snapshot import first_year
+
+COLUMNS = {
+    "Action": "Type",
+    "Time": "Date",
+    "Ticker": "Symbol",
+    "Name": "Instrument",
+    "No. of shares": "Quantity",
+    "Price / share": "Price",
+    "Currency (Price / share)": "Currency",
+    "Exchange rate": "FX rate",
+    "Total (EUR)": "Amount EUR",
+    "Withholding tax": "Tax",
+}
+ACTIONS = {"BUY": "Market buy", "SELL": "Market sell", "DIVIDEND": "Dividend (Ordinary)"}
+NUMBER_COLUMNS = ["No. of shares", "Price / share", "Exchange rate", "Total (EUR)", "Withholding tax"]
+
+
+@pytest.fixture
+def broker_format() -> Iterator[BrokerFormat]:
+    yield register_format(
+        BrokerFormat(
+            name="test-broker",
+            signature=["Type", "Date", "ISIN", "Symbol"],
+            columns=COLUMNS,
+            actions=ACTIONS,
+            delimiter=";",
+            decimal=",",
+            time_format="%d.%m.%Y %H:%M:%S",
+            na_values=["n/a"],
+        )
+    )
+
+    FORMATS.pop("test-broker")
+    compile_reader.cache_clear()
+
+
+@pytest.fixture
+def broker_path(tmp_path: Path, broker_format: BrokerFormat) -> Path:
+    """The Trading212 test exports rewritten in the layout of 'broker_format'."""
+    for csv_path in HISTORY_DATA_ROOT.iterdir():
+        export = pd.read_csv(csv_path, dtype=str, keep_default_na=False).replace("Not available", "n/a")
+        export = export.assign(
+            Action=export.Action.replace({action: source for source, action in ACTIONS.items()}),
+            Time=pd.to_datetime(export.Time).dt.strftime(broker_format.time_format),
+            **{column: export[column].str.replace(".", ",") for column in NUMBER_COLUMNS},
+        )
+        export.rename(columns=COLUMNS).to_csv(tmp_path / csv_path.name, sep=";", index=False)
+
+    return tmp_path
+
+
+def test_columns_are_deterministic() -> None:
+    history = PositionHistory(path=HISTORY_DATA_ROOT)
+
+    assert history.columns == ["Action", *PositionHistory._columns]
+    assert history.columns == PositionHistory(path=HISTORY_DATA_ROOT).columns
+
+
+def test_detect_format(broker_path: Path, tmp_path: Path) -> None:
+    assert detect_format(HISTORY_DATA_ROOT / "test_2020.csv").name == "trading212"
+    assert detect_format(broker_path / "test_2020.csv").name == "test-broker"
+
+    (tmp_path / "unknown.csv").write_text("When,What\n")
+    with pytest.raises(ValueError):
+        detect_format(tmp_path / "unknown.csv")
+
+
+def test_unknown_broker() -> None:
+    with pytest.raises(ValidationError):
+        PositionHistory(path=HISTORY_DATA_ROOT, broker="unknown")
+
+
+@pytest.mark.parametrize("chunksize", [None, 50])
+def test_history_matches_trading212(broker_path: Path, chunksize: Optional[int]) -> None:
+    for history_class in [DividendHistory, PositionHistory]:
+        history = history_class(path=broker_path, chunksize=chunksize).read()
+        expected = history_class(path=HISTORY_DATA_ROOT).read()
+
+        assert list(history.columns) == list(expected.columns)
+        pd.testing.assert_frame_equal(
+            history.sort_values("Time", ignore_index=True),
+            expected.sort_values("Time", ignore_index=True),
+            check_categorical=False,
+        )
+
+
+def test_reports_match_trading212(broker_path: Path) -> None:
+    years = [2020, 2021, 2022]
+
+    for report_class, history_class in [(FifoPositionReport, PositionHistory), (DividendReport, DividendHistory)]:
+        pd.testing.assert_frame_equal(
+            report_class(years=years, history=history_class(path=broker_path, broker="test-broker")).create_report(),
+            report_class(years=years, history=history_class(path=HISTORY_DATA_ROOT)).create_report(),
+        )
+
+
+def test_first_year(broker_path: Path) -> None:
+    assert first_year(broker_path / "test_2021.csv") == first_year(HISTORY_DATA_ROOT / "test_2021.csv") == 2021
+
+
+def test_defaults(tmp_path: Path) -> None:
+    register_format(
+        BrokerFormat(name="eur-broker", signature=["Action", "Time", "Ticker"], defaults={"Exchange rate": 1.0})
+    )
+    (tmp_path / "export.csv").write_text("Action,Time,Ticker\nMarket buy,2021-01-04 09:35:31,ABC\n")
+
+    try:
+        history = PositionHistory(path=tmp_path).read_file(
+            tmp_path / "export.csv", columns=["Action", "Time", "Ticker", "Exchange rate"]
+        )
+    finally:
+        FORMATS.pop("eur-broker")
+        compile_reader.cache_clear()
+
+    assert history["Exchange rate"].tolist() == [1.0]
+    assert history["Exchange rate"].dtype == "float64"
@@ -0,0 +1,107 @@
+import asyncio
+import os
+from pathlib import Path
+from typing import Type
+
+import pandas as pd
+import pytest
+
+from sp import shared
+from sp._testing.env import HISTORY_DATA_ROOT
+from sp.executor import ReportExecutor
+from sp.history import DividendHistory, PositionHistory
+from sp.index import HistoryIndex
+from sp.model import HistoryModel, ReportModel
+from sp.report import DividendReport, FifoPositionReport
+from sp.shared import SharedHistory
+
+
+def test_slice_matches_partition() -> None:
+    history = PositionHistory(path=HISTORY_DATA_ROOT).read()
+    ticker_groups = history.groupby("Ticker", sort=False, observed=True)
+
+    with SharedHistory.share(HistoryIndex.build(history)) as shared_history:
+        assert shared_history.path.exists()
+        assert set(shared_history.ranges) == set(history.Ticker.unique())
+
+        for ticker in ["VECP", "GME", "LGGL"]:
+            pd.testing.assert_frame_equal(
+                shared_history.slice(ticker), ticker_groups.get_group(ticker).reset_index(drop=True)
+            )
+
+    assert not shared_history.path.exists()
+
+
+@pytest.mark.parametrize(
+    "report_class,history_class", [(DividendReport, DividendHistory), (FifoPositionReport, PositionHistory)]
+)
+@pytest.mark.parametrize("backend", ["process", "serial"])
+def test_shared_report_matches_partitioned_report(
+    report_class: Type[ReportModel], history_class: Type[HistoryModel], backend: str
+) -> None:
+    reports = [
+        report_class(
+            years=[2021, 2022],
+            history=history_class(path=HISTORY_DATA_ROOT),
+            share_history=share_history,
+            backend=backend,
+            n_workers=2,
+        ).create_report()
+        for share_history in [True, False]
+    ]
+
+    pd.testing.assert_frame_equal(*reports)
+
+
+def test_closing_report_releases_shared_history(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+    monkeypatch.setattr(shared, "SHARED_MEMORY_ROOT", tmp_path)
+    report = DividendReport(
+        years=[2021, 2022],
+        history=DividendHistory(path=HISTORY_DATA_ROOT),
+        share_history=True,
+        backend="thread",
+        n_workers=2,
+    )
+
+    reports = report.iter_batches(batch_size=1)
+    _ = next(reports)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    reports.close()
+    assert not list(tmp_path.iterdir())
+
+
+def test_closing_pipelined_report_releases_shared_history(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+    monkeypatch.setattr(shared, "SHARED_MEMORY_ROOT", tmp_path)
+    report = DividendReport(
+        years=[2021, 2022],
+        history=DividendHistory(path=HISTORY_DATA_ROOT),
+        share_history=True,
+        backend="thread",
+        n_workers=2,
+    )
+
+    async def stop_after_first_batch() -> None:
+        batches = report.aiter_batches(batch_size=1, queue_size=1)
+        _ = await batches.__anext__()
+        assert len(list(tmp_path.iterdir())) == 1
+
+        await batches.aclose()
+        assert not list(tmp_path.iterdir())
+
+    asyncio.run(stop_after_first_batch())
+
+
+@pytest.mark.skipif(not Path("/proc/self/maps").exists(), reason="Needs /proc to inspect the mappings of the workers.")
+def test_reused_workers_release_shared_history() -> None:
+    with ReportExecutor(backend="process", n_workers=2) as executor:
+        report = DividendReport(
+            years=[2022], history=DividendHistory(path=HISTORY_DATA_ROOT), share_history=True, n_workers=2
+        )
+        _ = report.create_report(executor=executor)
+
+        # The pool outlives the report, its idle workers must not keep the removed history mapped.
+        for pid in executor._pools["process"]._processes:
+            assert "sp-history-" not in Path(f"/proc/{pid}/maps").read_text(encoding="utf-8")
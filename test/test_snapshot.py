@@ -0,0 +1,83 @@
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+import pytest
+
+from sp._testing.synthetic import SyntheticExport
+from sp.history import PositionHistory
+from sp.report import FifoPositionReport
+from sp.snapshot import FifoSnapshots
+
+YEARS = [2019, 2020, 2021, 2022]
+
+
+@pytest.fixture
+def data_path(tmp_path: Path) -> Path:
+    SyntheticExport(n_tickers=8, fills_per_ticker=120, years=YEARS, n_files=4).write(tmp_path / "data")
+
+    return tmp_path / "data"
+
+
+def snapshot_report(data_path: Path, snapshot_path: Path, years: List[int]) -> pd.DataFrame:
+    return FifoPositionReport(
+        years=years, history=PositionHistory(path=data_path), snapshot_path=snapshot_path
+    ).create_report()
+
+
+def full_report(data_path: Path, years: List[int]) -> pd.DataFrame:
+    report = FifoPositionReport(years=years, history=PositionHistory(path=data_path)).create_report()
+
+    return report[report.TAX_YEAR.isin(years)].reset_index(drop=True)
+
+
+@pytest.mark.parametrize("years", [[2022], [2020, 2021], [2019]])
+def test_snapshot_report_matches_full_replay(data_path: Path, tmp_path: Path, years: List[int]) -> None:
+    snapshot_path = tmp_path / "snapshots"
+
+    for _ in range(2):
+        pd.testing.assert_frame_equal(
+            snapshot_report(data_path, snapshot_path, years), full_report(data_path, years), check_exact=False
+        )
+
+
+def test_snapshots_are_reused(data_path: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    snapshot_path = tmp_path / "snapshots"
+    rolled: List[int] = []
+    year_end_lots = FifoPositionReport.year_end_lots
+
+    def tracked_year_end_lots(self: FifoPositionReport, history: pd.DataFrame, year: int) -> pd.DataFrame:
+        rolled.append(year)
+        return year_end_lots(self, history, year)
+
+    monkeypatch.setattr(FifoPositionReport, "year_end_lots", tracked_year_end_lots)
+
+    _ = snapshot_report(data_path, snapshot_path, [2021])
+    assert rolled == [2019, 2020]
+
+    _ = snapshot_report(data_path, snapshot_path, [2022])
+    assert rolled == [2019, 2020, 2021]
+
+    # A new export of a later year leaves the earlier year ends valid.
+    SyntheticExport(n_tickers=2, fills_per_ticker=5, years=[2023], n_files=1).write(tmp_path / "new")
+    (tmp_path / "new" / "export_000.csv").rename(data_path / "export_new.csv")
+    _ = snapshot_report(data_path, snapshot_path, [2022])
+    assert rolled == [2019, 2020, 2021]
+
+
+def test_changed_export_invalidates_snapshots(data_path: Path, tmp_path: Path) -> None:
+    snapshot_path = tmp_path / "snapshots"
+    _ = snapshot_report(data_path, snapshot_path, [2022])
+
+    store = FifoSnapshots.at(snapshot_path)
+    variant = FifoPositionReport(history=PositionHistory(path=data_path)).snapshot_variant
+    assert store.latest(variant, store.sources(sorted(data_path.iterdir())), before=2022) == 2021
+
+    first_export = sorted(data_path.iterdir())[0]
+    history = pd.read_csv(first_export)
+    history.iloc[:-1].to_csv(first_export, index=False)
+
+    assert store.latest(variant, store.sources(sorted(data_path.iterdir())), before=2022) is None
+    pd.testing.assert_frame_equal(
+        snapshot_report(data_path, snapshot_path, [2022]), full_report(data_path, [2022]), check_exact=False
+    )
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+import pandas as pd
+
+from sp._testing.synthetic import EXPORT_COLUMNS, SyntheticExport
+from sp.history import DividendHistory, PositionHistory
+from sp.report import DividendReport, FifoPositionReport
+
+
+def test_exports_are_deterministic(tmp_path: Path) -> None:
+    export = SyntheticExport(n_tickers=4, fills_per_ticker=30, n_files=2)
+
+    first = [csv_path.read_bytes() for csv_path in export.write(tmp_path / "first")]
+    second = [csv_path.read_bytes() for csv_path in export.write(tmp_path / "second")]
+    other_seed = [csv_path.read_bytes() for csv_path in export.copy(update={"seed": 1}).write(tmp_path / "third")]
+
+    assert len(first) == 2
+    assert first == second
+    assert first != other_seed
+
+
+def test_exports_match_trading212_layout(tmp_path: Path) -> None:
+    export = SyntheticExport(n_tickers=6, fills_per_ticker=40, years=[2021, 2022], n_files=3, dividends_per_year=2)
+    csv_paths = export.write(tmp_path)
+
+    histories = [pd.read_csv(csv_path) for csv_path in csv_paths]
+    history = pd.concat(histories, ignore_index=True)
+
+    assert all(list(csv_history.columns) == EXPORT_COLUMNS for csv_history in histories)
+    assert history.Time.is_monotonic_increasing
+    assert set(history.Time.str[:4].astype(int)) == {2021, 2022}
+    assert (history.Action == "Dividend (Ordinary)").sum() == 6 * 2 * 2
+    assert (history.Action.isin(["Market buy", "Market sell"])).sum() == 6 * 40
+
+
+def test_reports_run_on_exports(tmp_path: Path) -> None:
+    SyntheticExport(n_tickers=6, fills_per_ticker=80).write(tmp_path)
+
+    fifo_report = FifoPositionReport(years=[2022], history=PositionHistory(path=tmp_path)).create_report()
+    dividend_report = DividendReport(years=[2022], history=DividendHistory(path=tmp_path)).create_report()
+
+    assert len(fifo_report) > 0
+    assert set(dividend_report.TICKER) == {f"T{ticker:04d}" for ticker in range(6)}
@@ -1,11 +1,18 @@
+import json
+import os
 import shutil
 import xml.etree.ElementTree as etree
 from pathlib import Path
+from typing import List, Type
+from xml.etree.ElementTree import Element
 
 import pytest
 
 from sp._testing.env import HISTORY_DATA_ROOT, TEST_DATA_ROOT
-from sp.xml_writer import DivDohXML
+from sp.executor import ReportExecutor
+from sp.history import DividendHistory
+from sp.report import DividendReport
+from sp.xml_writer import DivDohXML, PersonalInfo, dividend_records
 
 
 @pytest.mark.parametrize("input_path", [(HISTORY_DATA_ROOT)])
@@ -33,3 +40,127 @@ def test_write(input_path: Path) -> None:
     assert etree.tostring(test_xml) == etree.tostring(compare_xml)
 
     shutil.rmtree(output_path)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_write_is_byte_identical(tmp_path: Path, stream: bool) -> None:
+    base_path = TEST_DATA_ROOT / "test_xml_writer" / "test_write"
+    output_xml = tmp_path / "output.xml"
+
+    xml_writer = DivDohXML(
+        input_path=HISTORY_DATA_ROOT,
+        output_path=output_xml,
+        personal_info_path=base_path / "test_config.json",
+        stream=stream,
+    )
+    xml_writer.write()
+
+    assert output_xml.read_bytes() == (base_path / "compare.xml").read_bytes()
+
+
+@pytest.mark.parametrize("backend", ["serial", "thread", "process"])
+def test_pipelined_write_is_byte_identical(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, backend: str) -> None:
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+    base_path = TEST_DATA_ROOT / "test_xml_writer" / "test_write"
+    expected = DividendReport(years=[2022], history=DividendHistory(path=HISTORY_DATA_ROOT)).create_report()
+
+    xml_writer = DivDohXML(
+        input_path=HISTORY_DATA_ROOT,
+        output_path=tmp_path / "output.xml",
+        personal_info_path=base_path / "test_config.json",
+        pipeline=True,
+        batch_size=2,
+        queue_size=1,
+    )
+    with ReportExecutor(backend=backend, n_workers=2) as executor:
+        xml_writer.write(executor=executor)
+
+    assert (tmp_path / "output.xml").read_bytes() == (base_path / "compare.xml").read_bytes()
+    assert (tmp_path / "report.csv").read_text() == expected.to_csv(index=False)
+
+
+def test_personal_info_is_parsed_once_per_modification(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    config_path = tmp_path / "config.json"
+    shutil.copy(TEST_DATA_ROOT / "test_xml_writer" / "test_write" / "test_config.json", config_path)
+
+    parsed: List[Path] = []
+    from_file = PersonalInfo.from_file.__func__  # type: ignore[attr-defined]
+
+    def tracked_from_file(cls: Type[PersonalInfo], path: Path) -> PersonalInfo:
+        parsed.append(path)
+        return from_file(cls, path)
+
+    monkeypatch.setattr(PersonalInfo, "from_file", classmethod(tracked_from_file))
+
+    writers = [
+        DivDohXML(input_path=HISTORY_DATA_ROOT, output_path=tmp_path / f"{i}.xml", personal_info_path=config_path)
+        for i in range(2)
+    ]
+    for writer in writers:
+        _ = writer.create_header(Element("Envelope"))
+    assert len(parsed) == 1
+
+    config = json.loads(config_path.read_text())
+    config["doh_div_info"]["period"] = "2021"
+    config_path.write_text(json.dumps(config))
+    os.utime(config_path, ns=(config_path.stat().st_atime_ns, config_path.stat().st_mtime_ns + 10**9))
+
+    assert writers[0].personal_info.doh_div_info.period == "2021"
+    assert len(parsed) == 2
+
+
+@pytest.mark.parametrize("batch_size", [1, 1_000])
+def test_csv_report_matches_report(tmp_path: Path, batch_size: int) -> None:
+    xml_writer = DivDohXML(
+        input_path=HISTORY_DATA_ROOT,
+        output_path=tmp_path / "output.xml",
+        personal_info_path=TEST_DATA_ROOT / "test_xml_writer" / "test_write" / "test_config.json",
+        batch_size=batch_size,
+        stream=True,
+    )
+    xml_writer.write()
+
+    report = DividendReport(years=[2022], history=DividendHistory(path=HISTORY_DATA_ROOT)).create_report()
+
+    assert (tmp_path / "report.csv").read_text() == report.to_csv(index=False)
+
+
+def test_dividend_records_match_rows() -> None:
+    report = DividendReport(years=[2020, 2021, 2022], history=DividendHistory(path=HISTORY_DATA_ROOT)).create_report()
+    report = report.assign(
+        TAX=report.TAX.where(report.index > 0),
+        PAYER_ADDRESS="Address",
+        PAYER_COUNTRY="Country",
+        RELIEF_STATEMENT="Statement",
+    )
+
+    records = list(dividend_records(report))
+
+    assert len(records) == len(report)
+    for record, (_, row) in zip(records, report.iterrows()):
+        assert (record.date, record.isin, record.name) == (row.DATE, row.ISIN, row.NAME)
+        assert (record.value, record.foreign_tax) == (str(row.TOTAL), str(row.TAX))
+
+
+@pytest.mark.parametrize("mode", ["write", "stream", "pipeline"])
+def test_failed_write_keeps_previous_output(tmp_path: Path, mode: str) -> None:
+    payers_path = tmp_path / "payers.csv"
+    payers_path.write_text("ISIN,ISSUER,PAYER_ADDRESS,PAYER_COUNTRY,RELIEF_STATEMENT\n")
+    output_path = tmp_path / "output"
+    output_path.mkdir()
+    (output_path / "output.xml").write_text("previous")
+
+    xml_writer = DivDohXML(
+        input_path=HISTORY_DATA_ROOT,
+        output_path=output_path / "output.xml",
+        personal_info_path=TEST_DATA_ROOT / "test_xml_writer" / "test_write" / "test_config.json",
+        payers_path=payers_path,
+        stream=mode == "stream",
+        pipeline=mode == "pipeline",
+        batch_size=2,
+    )
+    with pytest.raises(ValueError):
+        xml_writer.write()
+
+    assert [path.name for path in output_path.iterdir()] == ["output.xml"]
+    assert (output_path / "output.xml").read_text() == "previous"